@@ -1,9 +1,9 @@
 import os
-import pickle
 import datetime
-import csv
+import queue
+import threading
+import time
 import tkinter as tk
-import shutil
 from tkinter import (
     messagebox,
     filedialog,
@@ -18,10 +18,11 @@ from tkinter import ttk
 from PIL import Image, ImageTk
 
 # --------------------
-from openpyxl import Workbook, load_workbook
-import cv2
-import face_recognition
-import numpy as np
+# cv2, face_recognition, numpy and openpyxl are imported where they are used,
+# so the window shows up before they are loaded (see warm_up below)
+from attendance_store import CsvStore, SqliteStore, XlsxStore
+from settings import load_settings
+from warmup import WarmUp, import_steps, warm_up_models
 
 
 # --- SETUP ---
@@ -29,18 +30,46 @@ data_dir = "data"
 encoding_file = os.path.join(data_dir, "encodings.pkl")
 attendance_csv = os.path.join(data_dir, "attendance.csv")
 attendance_xlsx = os.path.join(data_dir, "attendance.xlsx")
+attendance_journal = os.path.join(data_dir, "attendance_journal.csv")
+attendance_db = os.path.join(data_dir, "attendance.db")
 os.makedirs(data_dir, exist_ok=True)
+settings = load_settings()
+
+# One store per log format; xlsx marks go through an append-only journal
+attendance_stores = {
+    "xlsx": XlsxStore(
+        attendance_xlsx,
+        attendance_journal,
+        flush_interval=settings["xlsx_flush_seconds"],
+    ),
+    "csv": CsvStore(attendance_csv),
+    "sqlite": SqliteStore(attendance_db),
+}
+
+# Registered faces: a memory-mapped snapshot plus a write-ahead log of changes.
+# Opened by load_encodings().
+gallery = None
 
 # Global variables
-known_encodings = []
 known_person_data = []
+# The running recognition session: its worker thread and stop flag
+recognition_thread = None
+recognition_stop = None
+# Search structure over the registered encodings, rebuilt by load_encodings()
+gallery_index = None
+
+# Loads the heavy libraries and the gallery in the background once the window
+# is up, then runs the face models once so the first real frame is not slowed
+# down by their first use. Anything that needs them calls warm_up.wait() first.
+warm_up = WarmUp(
+    import_steps() + [("gallery", lambda: load_encodings()), ("models", warm_up_models)]
+)
 
 
 # --- CORE FUNCTIONS ---
-def save_encodings():
-    """Saves the known face encodings and person data to a pickle file."""
-    with open(encoding_file, "wb") as f:
-        pickle.dump((known_encodings, known_person_data), f)
+def save_encodings(encoding, person_data):
+    """Records one registered face in the gallery's write-ahead log."""
+    gallery.add(encoding, person_data)
 
 
 # def load_encodings():
@@ -54,87 +83,34 @@ def save_encodings():
 #         known_person_data = []
 
 
-# --- CORRECTED GLOBAL FIX ---
 def load_encodings():
     """
-    Loads face encodings and person data from a pickle file.
-    This version also sanitizes the data to remove corrupted/invalid entries,
-    fixing the root cause of the "string indices must be integers" error.
+    Loads face encodings and person data from the gallery files.
+    The first time, the old pickle file is migrated into the gallery.
     """
-    global known_encodings, known_person_data
-
-    # Always start with fresh lists
-    clean_encodings = []
-    clean_person_data = []
+    global gallery, known_person_data, gallery_index
+    from gallery import Gallery
+    from matcher import make_matcher
 
-    if os.path.exists(encoding_file):
-        try:
-            with open(encoding_file, "rb") as f:
-                # Load the potentially corrupted data from the file
-                loaded_encodings, loaded_person_data = pickle.load(f)
-
-            # Iterate through the loaded data and keep only the valid pairs
-            for i, person in enumerate(loaded_person_data):
-                # We only keep the item if it's a dictionary
-                if isinstance(person, dict):
-                    # And if its corresponding encoding exists
-                    if i < len(loaded_encodings):
-                        clean_person_data.append(person)
-                        clean_encodings.append(loaded_encodings[i])
-
-            # If we found and removed bad data, let the user know and save the clean file
-            if len(clean_person_data) != len(loaded_person_data):
-                print(
-                    f"Warning: Corrupted data was found and removed from {encoding_file}."
-                )
-                # Overwrite the old file with the cleaned data
-                with open(encoding_file, "wb") as f:
-                    pickle.dump((clean_encodings, clean_person_data), f)
+    if gallery is None:
+        gallery = Gallery(data_dir)
+    gallery.migrate_pickle(encoding_file)
+    try:
+        encodings, person_data = gallery.load()
+    except Exception as e:
+        print(f"Error reading the gallery in {data_dir}: {e}.")
+        encodings, person_data = [], []
 
-        except Exception as e:
-            # This handles cases where the file is completely unreadable
-            print(f"Error reading {encoding_file}: {e}. A new file will be used.")
-            # The lists will remain empty, which is safe
-
-    # Set the global variables to the cleaned lists
-    known_encodings = clean_encodings
-    known_person_data = clean_person_data
-
-
-def mark_attendance(person_data):
-    """Marks attendance with NIS, Name, and Class."""
-    now = datetime.datetime.now()
-    date_str = now.strftime("%Y-%m-%d")
-    time_str = now.strftime("%H:%M:%S")
-    file_format = selected_format.get()
-
-    row_data = [
-        person_data["nis"],
-        person_data["name"],
-        person_data["class"],
-        date_str,
-        time_str,
-    ]
-    header = ["NIS", "Name", "Class", "Date", "Time"]
-
-    if file_format == "xlsx":
-        if os.path.exists(attendance_xlsx):
-            wb = load_workbook(attendance_xlsx)
-            ws = wb.active
-        else:
-            wb = Workbook()
-            ws = wb.active
-            ws.append(header)
+    known_person_data = person_data
+    # The index uses the memory-mapped snapshot as it is, without a copy
+    gallery_index = make_matcher(
+        settings["match_index"], encodings, nprobe=settings["ivf_nprobe"]
+    )
 
-        ws.append(row_data)
-        wb.save(attendance_xlsx)
 
-    elif file_format == "csv":
-        with open(attendance_csv, "a", newline="") as f:
-            writer = csv.writer(f)
-            if os.stat(attendance_csv).st_size == 0:
-                writer.writerow(header)
-            writer.writerow(row_data)
+def get_attendance_store():
+    """Returns the attendance store for the selected log format."""
+    return attendance_stores[selected_format.get()]
 
 
 def register_face():
@@ -177,7 +153,19 @@ def register_face():
 
 def capture_face_for_registration(person_data):
     """Handles the face capture process after getting user details."""
-    cap = cv2.VideoCapture(0)
+    import cv2
+    import face_recognition
+
+    from capture import camera_properties, open_camera
+
+    if recognition_thread is not None:
+        messagebox.showinfo(
+            "Recognition Running",
+            "Stop the recognition before registering a new student.",
+        )
+        return
+    warm_up.wait()
+    cap = open_camera(0, **camera_properties(settings))
     if not cap.isOpened():
         messagebox.showerror("Error", "Could not open webcam.")
         return
@@ -200,12 +188,16 @@ def capture_face_for_registration(person_data):
             encodings = face_recognition.face_encodings(rgb_frame, boxes)
 
             if encodings:
-                known_encodings.append(encodings[0])
-                known_person_data.append(person_data)
-                save_encodings()
-                messagebox.showinfo(
-                    "Success", f"Face registered for {person_data['name']}!"
-                )
+                try:
+                    save_encodings(encodings[0], person_data)
+                except Exception as e:
+                    messagebox.showerror("Error", f"Could not save the face: {e}")
+                else:
+                    known_person_data.append(person_data)
+                    gallery_index.add(encodings[0])
+                    messagebox.showinfo(
+                        "Success", f"Face registered for {person_data['name']}!"
+                    )
             else:
                 messagebox.showerror("Error", "No face detected. Please try again.")
             break
@@ -217,94 +209,158 @@ def capture_face_for_registration(person_data):
 
 
 def recognize_face():
-    """Recognizes faces using the webcam and marks attendance."""
+    """
+    Recognizes faces using the webcam and marks attendance. Recognition runs
+    on a worker thread and its preview is shown in a window of the app, so
+    the logs and the tolerance stay usable while it runs.
+
+    The preview is drawn by the UI at up to display_fps frames per second,
+    always from the newest result, so processing never waits for drawing.
+    With display_fps 0 nothing is drawn at all.
+    """
+    global recognition_thread, recognition_stop
+    import cv2
+
+    from capture import camera_mode, camera_properties, open_source
+    from engine import RecognitionEngine
+
+    if recognition_thread is not None:
+        return
+
+    warm_up.wait()
     load_encodings()
-    cap = cv2.VideoCapture(0)
+    engine = RecognitionEngine(
+        gallery_index,
+        known_person_data,
+        get_attendance_store(),
+        settings,
+        tolerance=tolerance_var.get(),
+    )
+    # Capture runs on its own thread so we always process the newest frame
+    cap = open_source(
+        0,
+        camera_properties(settings),
+        mode=settings["capture_mode"],
+        target_fps=settings["capture_fps"],
+    )
     if not cap.isOpened():
+        cap.release()
+        engine.close()
         messagebox.showerror("Error", "Could not open webcam.")
         return
-
-    todays_attendance_nis = set()
-    file_format = selected_format.get()
-    date_str = datetime.datetime.now().strftime("%Y-%m-%d")
+    mode = camera_mode(cap.cap)
+    print(
+        f"Camera: {mode['width']}x{mode['height']} {mode['fourcc']} "
+        f"at {mode['fps']:g} fps"
+    )
 
     try:
-        if file_format == "xlsx" and os.path.exists(attendance_xlsx):
-            wb = load_workbook(attendance_xlsx)
-            ws = wb.active
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if len(row) > 3 and row[3] == date_str:
-                    todays_attendance_nis.add(row[0])
-        elif file_format == "csv" and os.path.exists(attendance_csv):
-            with open(attendance_csv, "r") as f:
-                reader = csv.reader(f)
-                next(reader, None)
-                for row in reader:
-                    if len(row) > 3 and row[3] == date_str:
-                        todays_attendance_nis.add(row[0])
+        engine.load_marks()
     except Exception as e:
         messagebox.showerror("Error", f"Could not read attendance file: {e}")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_small_frame)
-        face_encodings = face_recognition.face_encodings(
-            rgb_small_frame, face_locations
-        )
-        tolerance = tolerance_var.get()
-
-        for (top, right, bottom, left), face_encoding in zip(
-            face_locations, face_encodings
-        ):
-            matches = face_recognition.compare_faces(
-                known_encodings, face_encoding, tolerance=tolerance
+    # Only the newest result waits for the display; older ones are skipped
+    display_fps = settings["display_fps"]
+    results = queue.Queue(maxsize=1)
+    preview_counts = {"shown": 0, "skipped": 0}
+    stop = threading.Event()
+    errors = []
+
+    def publish(frame, faces):
+        # Runs on the worker thread: hand over the result, drawing is left
+        # to the display
+        if display_fps:
+            try:
+                results.get_nowait()
+                preview_counts["skipped"] += 1
+            except queue.Empty:
+                pass
+            results.put_nowait((frame, faces))
+        return not stop.is_set()
+
+    def run():
+        try:
+            engine.run(cap, on_frame=publish)
+        except Exception as e:
+            errors.append(e)
+
+    window = Toplevel(root)
+    window.title("Face Recognition - Press 'q' to Exit")
+    canvas = tk.Canvas(window, width=640, height=480, highlightthickness=0)
+    canvas_image = canvas.create_image(0, 0, anchor="nw")
+    status = tk.Label(window, width=40, pady=20)
+    if display_fps:
+        canvas.pack()
+    else:
+        status.pack()
+    ttk.Button(window, text="Stop", command=stop.set).pack(pady=5)
+    window.protocol("WM_DELETE_WINDOW", stop.set)
+    window.bind("<KeyPress-q>", lambda event: stop.set())
+    # Profile the next seconds of the loop into data/
+    window.bind("<KeyPress-p>", lambda event: engine.profiler.request())
+    window.focus_set()
+
+    # The worker reads engine.tolerance, never the Tk variable itself
+    def on_tolerance(*args):
+        engine.tolerance = tolerance_var.get()
+
+    tolerance_trace = tolerance_var.trace_add("write", on_tolerance)
+    photo = None
+
+    def show(frame, faces):
+        nonlocal photo
+        t = time.perf_counter()
+        engine.draw(frame, faces)
+        if settings["metrics_overlay"]:
+            engine.draw_metrics(frame)
+        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if photo is not None and (photo.width(), photo.height()) == image.size:
+            # Reuse the same Tk image instead of allocating one per frame
+            photo.paste(image)
+        else:
+            photo = ImageTk.PhotoImage(image)
+            canvas.config(width=image.width, height=image.height)
+            canvas.itemconfig(canvas_image, image=photo)
+        preview_counts["shown"] += 1
+        engine.metrics.lap("display", t)
+
+    interval = int(1000 / display_fps) if display_fps else 500
+
+    def poll():
+        if display_fps:
+            try:
+                show(*results.get_nowait())
+            except queue.Empty:
+                pass
+        else:
+            status.config(
+                text=f"Recognizing: {engine.frames} frames, {engine.marks} marked"
             )
-            display_name = "Unknown"
-            confidence_str = ""
-
-            if True in matches:
-                face_distances = face_recognition.face_distance(
-                    known_encodings, face_encoding
-                )
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index]:
-                    person_data = known_person_data[best_match_index]
-                    display_name = person_data["name"]
-
-                    confidence = 1 - face_distances[best_match_index]
-                    confidence_str = f"{confidence:.0%}"
-
-                    if person_data["nis"] not in todays_attendance_nis:
-                        mark_attendance(person_data)
-                        todays_attendance_nis.add(person_data["nis"])
-                        print(
-                            f"Attendance marked for {display_name} ({person_data['nis']})"
-                        )
-
-            top, right, bottom, left = top * 4, right * 4, bottom * 4, left * 4
-            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-            label = f"{display_name} {confidence_str}"
-            cv2.putText(
-                frame,
-                label,
-                (left, top - 10),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.7,
-                (0, 255, 0),
-                2,
+        if recognition_thread.is_alive():
+            window.after(interval, poll)
+        else:
+            finish()
+
+    def finish():
+        global recognition_thread, recognition_stop
+        recognition_thread = recognition_stop = None
+        tolerance_var.trace_remove("write", tolerance_trace)
+        engine.close()
+        window.destroy()
+        print(engine.report())
+        if display_fps:
+            print(
+                f"Preview: {preview_counts['shown']} frames shown at up to "
+                f"{display_fps} FPS, {preview_counts['skipped']} processed "
+                f"frames not drawn"
             )
+        if errors:
+            messagebox.showerror("Error", f"Recognition stopped: {errors[0]}")
 
-        cv2.imshow("Face Recognition - Press 'q' to Exit", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+    recognition_stop = stop
+    recognition_thread = threading.Thread(target=run, name="Recognition", daemon=True)
+    recognition_thread.start()
+    poll()
 
 
 def show_logs():
@@ -313,6 +369,19 @@ def show_logs():
     log_window.title("Attendance Logs")
     log_window.geometry("800x500")
 
+    # Optional filters; left empty, every row is shown
+    filter_frame = ttk.Frame(log_window, padding=(10, 10, 10, 0))
+    filter_frame.pack(fill="x")
+    ttk.Label(filter_frame, text="From (YYYY-MM-DD):").pack(side="left")
+    date_from_entry = ttk.Entry(filter_frame, width=12)
+    date_from_entry.pack(side="left", padx=(5, 10))
+    ttk.Label(filter_frame, text="To:").pack(side="left")
+    date_to_entry = ttk.Entry(filter_frame, width=12)
+    date_to_entry.pack(side="left", padx=(5, 10))
+    ttk.Label(filter_frame, text="Class:").pack(side="left")
+    class_entry = ttk.Entry(filter_frame, width=10)
+    class_entry.pack(side="left", padx=(5, 10))
+
     tree_frame = ttk.Frame(log_window, padding="10")
     tree_frame.pack(expand=True, fill="both")
 
@@ -340,34 +409,32 @@ def show_logs():
     tree_frame.grid_rowconfigure(0, weight=1)
     tree_frame.grid_columnconfigure(0, weight=1)
 
-    file_format = selected_format.get()
-    log_file_path = attendance_xlsx if file_format == "xlsx" else attendance_csv
-
-    if not os.path.exists(log_file_path):
-        tree.insert("", tk.END, values=("No attendance records found.", "", "", "", ""))
-        return
+    store = get_attendance_store()
 
-    try:
-        content = []
-        if file_format == "xlsx":
-            wb = load_workbook(log_file_path)
-            ws = wb.active
-            for row in ws.iter_rows(values_only=True):
-                content.append([str(cell) if cell is not None else "" for cell in row])
-        else:
-            with open(log_file_path, "r", newline="") as f:
-                reader = csv.reader(f)
-                for row in reader:
-                    content.append(row)
+    def load_rows():
+        tree.delete(*tree.get_children())
+        if not store.exists():
+            tree.insert(
+                "", tk.END, values=("No attendance records found.", "", "", "", "")
+            )
+            return
 
-        if content:
-            for row_data in content[1:]:
+        try:
+            rows = store.rows(
+                date_from=date_from_entry.get().strip() or None,
+                date_to=date_to_entry.get().strip() or None,
+                class_=class_entry.get().strip() or None,
+            )
+            for row_data in rows:
                 if len(row_data) >= 5:
                     tree.insert("", tk.END, values=row_data[:5])
-    except Exception as e:
-        messagebox.showerror(
-            "Error", f"Failed to read log file: {e}", parent=log_window
-        )
+        except Exception as e:
+            messagebox.showerror(
+                "Error", f"Failed to read log file: {e}", parent=log_window
+            )
+
+    ttk.Button(filter_frame, text="Apply", command=load_rows).pack(side="left")
+    load_rows()
 
 
 # --- CORRECTED FUNCTION ---
@@ -376,6 +443,7 @@ def show_registered_students():
     Shows all registered students in a new window using ttk.Treeview.
     This version safely handles corrupted data in the pickle file.
     """
+    warm_up.wait()
     reg_window = Toplevel(root)
     reg_window.title("Registered Students")
     reg_window.geometry("600x400")
@@ -406,6 +474,8 @@ def show_registered_students():
     # --- FIX IS HERE ---
     # Filter the data to only include valid dictionaries, preventing crashes
     valid_data = [item for item in known_person_data if isinstance(item, dict)]
+    # Tree item -> person, so removal does not rely on the displayed text
+    people_by_item = {}
 
     if not valid_data:
         tree.insert("", tk.END, values=("No students registered yet.", "", ""))
@@ -417,15 +487,42 @@ def show_registered_students():
             nis = person.get("nis", "")
             name = person.get("name", "")
             class_ = person.get("class", "")
-            tree.insert("", tk.END, values=(nis, name, class_))
+            item = tree.insert("", tk.END, values=(nis, name, class_))
+            people_by_item[item] = person
+
+    def remove_selected():
+        selected = tree.selection()
+        if not selected or selected[0] not in people_by_item:
+            return
+        person = people_by_item[selected[0]]
+        nis, name = person.get("nis", ""), person.get("name", "")
+        if not messagebox.askyesno(
+            "Remove Student", f"Remove {name} ({nis}) from the registered faces?"
+        ):
+            return
+        try:
+            gallery.remove(nis)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not remove the student: {e}")
+            return
+        load_encodings()
+        # Several faces may be registered under the same NIS
+        for item, other in list(people_by_item.items()):
+            if other.get("nis") == nis:
+                tree.delete(item)
+                del people_by_item[item]
+
+    ttk.Button(reg_window, text="Remove Selected", command=remove_selected).pack(
+        pady=(0, 10)
+    )
 
 
 def export_logs():
     """Exports logs to a user-selected location."""
-    file_format = selected_format.get()
-    source_file = attendance_xlsx if file_format == "xlsx" else attendance_csv
+    store = get_attendance_store()
+    file_format = store.extension
 
-    if not os.path.exists(source_file):
+    if not store.exists():
         messagebox.showwarning("Warning", "No attendance file to export.")
         return
 
@@ -436,7 +533,7 @@ def export_logs():
 
     if export_path:
         try:
-            shutil.copy(source_file, export_path)
+            store.export(export_path)
             messagebox.showinfo(
                 "Export", f"Logs successfully exported to {export_path}"
             )
@@ -445,115 +542,135 @@ def export_logs():
 
 
 # --- GUI SETUP ---
-root = tk.Tk()
-root.title("Face Recognition Attendance")
-# Adjusted height to make space for the new button
-root.geometry("450x680")
-root.configure(bg="#f0f0f0")
-
-main_frame = tk.Frame(root, bg="#f0f0f0", padx=20, pady=20)
-main_frame.pack(expand=True, fill="both")
-
-### --- ADDED FOR LOGO --- ###
-try:
-    logo_image = Image.open("logos//logo_right_new.png")
-    logo_image = logo_image.resize((160, 154), Image.Resampling.LANCZOS)
-    logo_photo = ImageTk.PhotoImage(logo_image)
-    logo_label = tk.Label(main_frame, image=logo_photo, bg="#f0f0f0")
-    logo_label.image = logo_photo
-    logo_label.pack(pady=(0, 10))
-except FileNotFoundError:
-    print("Warning: logo.png not found. The application will run without a logo.")
-except Exception as e:
-    print(f"An error occurred while loading the logo: {e}")
-### ---------------------- ###
-
-
-title_label = tk.Label(
-    main_frame,
-    text="Absensi Sholat Duhur\nSiswa SMAN 1 Paguyangan",
-    font=("Helvetica", 16, "bold"),
-    bg="#f0f0f0",
-    justify=tk.CENTER,
-)
-title_label.pack(pady=(5, 20))
-
-btn_register = tk.Button(
-    main_frame, text="Register New Student", command=register_face, width=30, height=2
-)
-btn_register.pack(pady=5)
-
-# --- NEW BUTTON ADDED HERE ---
-btn_show_registered = tk.Button(
-    main_frame,
-    text="Show Registered Students",
-    command=show_registered_students,
-    width=30,
-    height=2,
-)
-btn_show_registered.pack(pady=5)
-# -----------------------------
-
-btn_recognize = tk.Button(
-    main_frame,
-    text="Start Recognition & Attendance",
-    command=recognize_face,
-    width=30,
-    height=2,
-)
-btn_recognize.pack(pady=5)
-
-btn_logs = tk.Button(
-    main_frame, text="Show Attendance Logs", command=show_logs, width=30, height=2
-)
-btn_logs.pack(pady=5)
+# Guarded so encoder worker processes can import this module without opening
+# a second window.
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.title("Face Recognition Attendance")
+    # Adjusted height to make space for the new button
+    root.geometry("450x680")
+    root.configure(bg="#f0f0f0")
+
+    main_frame = tk.Frame(root, bg="#f0f0f0", padx=20, pady=20)
+    main_frame.pack(expand=True, fill="both")
+
+    ### --- ADDED FOR LOGO --- ###
+    try:
+        logo_image = Image.open("logos//logo_right_new.png")
+        logo_image = logo_image.resize((160, 154), Image.Resampling.LANCZOS)
+        logo_photo = ImageTk.PhotoImage(logo_image)
+        logo_label = tk.Label(main_frame, image=logo_photo, bg="#f0f0f0")
+        logo_label.image = logo_photo
+        logo_label.pack(pady=(0, 10))
+    except FileNotFoundError:
+        print("Warning: logo.png not found. The application will run without a logo.")
+    except Exception as e:
+        print(f"An error occurred while loading the logo: {e}")
+    ### ---------------------- ###
+
+    title_label = tk.Label(
+        main_frame,
+        text="Absensi Sholat Duhur\nSiswa SMAN 1 Paguyangan",
+        font=("Helvetica", 16, "bold"),
+        bg="#f0f0f0",
+        justify=tk.CENTER,
+    )
+    title_label.pack(pady=(5, 20))
+
+    btn_register = tk.Button(
+        main_frame,
+        text="Register New Student",
+        command=register_face,
+        width=30,
+        height=2,
+    )
+    btn_register.pack(pady=5)
+
+    # --- NEW BUTTON ADDED HERE ---
+    btn_show_registered = tk.Button(
+        main_frame,
+        text="Show Registered Students",
+        command=show_registered_students,
+        width=30,
+        height=2,
+    )
+    btn_show_registered.pack(pady=5)
+    # -----------------------------
+
+    btn_recognize = tk.Button(
+        main_frame,
+        text="Start Recognition & Attendance",
+        command=recognize_face,
+        width=30,
+        height=2,
+    )
+    btn_recognize.pack(pady=5)
 
-btn_export = tk.Button(
-    main_frame, text="Export Logs", command=export_logs, width=30, height=2
-)
-btn_export.pack(pady=5)
-
-format_frame = tk.Frame(main_frame, bg="#f0f0f0")
-format_frame.pack(pady=10)
-format_label = tk.Label(format_frame, text="Log Format:", bg="#f0f0f0")
-format_label.pack(side="left", padx=(0, 10))
-selected_format = tk.StringVar(value="xlsx")
-format_menu = tk.OptionMenu(format_frame, selected_format, "xlsx", "csv")
-format_menu.config(width=8)
-format_menu.pack(side="left")
-
-tolerance_frame = tk.Frame(main_frame, bg="#f0f0f0")
-tolerance_frame.pack(pady=10, fill="x")
-tolerance_label = tk.Label(
-    tolerance_frame, text="Recognition Tolerance (Stricter <-> Looser)", bg="#f0f0f0"
-)
-tolerance_label.pack()
-tolerance_var = tk.DoubleVar(value=0.6)
-tolerance_slider = tk.Scale(
-    tolerance_frame,
-    from_=0.4,
-    to=0.7,
-    resolution=0.05,
-    orient="horizontal",
-    variable=tolerance_var,
-    bg="#f0f0f0",
-)
-tolerance_slider.pack(fill="x", expand=True)
+    btn_logs = tk.Button(
+        main_frame, text="Show Attendance Logs", command=show_logs, width=30, height=2
+    )
+    btn_logs.pack(pady=5)
 
-### --- ADDED FOR DEVELOPER CREDIT --- ###
-credit_text = (
-    f"Developed by Tim Riset SMAN 1 Paguyangan © {datetime.datetime.now().year}"
-)
-credit_label = tk.Label(
-    main_frame,
-    text=credit_text,
-    font=("Helvetica", 8),
-    fg="gray",
-    bg="#f0f0f0",
-)
-credit_label.pack(side="bottom", pady=5)
-### ------------------------------------ ###
+    btn_export = tk.Button(
+        main_frame, text="Export Logs", command=export_logs, width=30, height=2
+    )
+    btn_export.pack(pady=5)
+
+    format_frame = tk.Frame(main_frame, bg="#f0f0f0")
+    format_frame.pack(pady=10)
+    format_label = tk.Label(format_frame, text="Log Format:", bg="#f0f0f0")
+    format_label.pack(side="left", padx=(0, 10))
+    selected_format = tk.StringVar(value="xlsx")
+    format_menu = tk.OptionMenu(format_frame, selected_format, "xlsx", "csv", "sqlite")
+    format_menu.config(width=8)
+    format_menu.pack(side="left")
+
+    tolerance_frame = tk.Frame(main_frame, bg="#f0f0f0")
+    tolerance_frame.pack(pady=10, fill="x")
+    tolerance_label = tk.Label(
+        tolerance_frame,
+        text="Recognition Tolerance (Stricter <-> Looser)",
+        bg="#f0f0f0",
+    )
+    tolerance_label.pack()
+    tolerance_var = tk.DoubleVar(value=0.6)
+    tolerance_slider = tk.Scale(
+        tolerance_frame,
+        from_=0.4,
+        to=0.7,
+        resolution=0.05,
+        orient="horizontal",
+        variable=tolerance_var,
+        bg="#f0f0f0",
+    )
+    tolerance_slider.pack(fill="x", expand=True)
 
-# Load existing data when the application starts
-load_encodings()
-root.mainloop()
+    ### --- ADDED FOR DEVELOPER CREDIT --- ###
+    credit_text = (
+        f"Developed by Tim Riset SMAN 1 Paguyangan © {datetime.datetime.now().year}"
+    )
+    credit_label = tk.Label(
+        main_frame,
+        text=credit_text,
+        font=("Helvetica", 8),
+        fg="gray",
+        bg="#f0f0f0",
+    )
+    credit_label.pack(side="bottom", pady=5)
+    ### ------------------------------------ ###
+
+    def on_close():
+        # Let a running recognition finish its current frame first
+        if recognition_thread is not None:
+            recognition_stop.set()
+            recognition_thread.join(timeout=5)
+        # Bring attendance.xlsx up to date with the journal before exiting
+        for store in attendance_stores.values():
+            store.close()
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
+
+    # Load the libraries and existing data once the window has been drawn
+    root.after(200, warm_up.start)
+    root.mainloop()
@@ -0,0 +1,553 @@
+"""Attendance log storage, one store per log format."""
+
+import csv
+import datetime
+import io
+import locale
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+
+HEADER = ["NIS", "Name", "Class", "Date", "Time"]
+
+
+def filter_rows(rows, date_from=None, date_to=None, class_=None):
+    """Keeps the rows within the (inclusive) date range and of the given class."""
+    for row in rows:
+        if len(row) < len(HEADER):
+            yield row
+            continue
+        if date_from and row[3] < date_from:
+            continue
+        if date_to and row[3] > date_to:
+            continue
+        if class_ and row[2] != class_:
+            continue
+        yield row
+
+
+def attendance_row(person, now=None):
+    """Returns the log row (see HEADER) for a student marked at `now`."""
+    now = now or datetime.datetime.now()
+    return [
+        person["nis"],
+        person["name"],
+        person["class"],
+        now.strftime("%Y-%m-%d"),
+        now.strftime("%H:%M:%S"),
+    ]
+
+
+class CsvStore:
+    """
+    Attendance rows appended straight to attendance.csv.
+
+    A small sidecar file (attendance.csv.idx) lists the byte offset where each
+    run of rows for one date begins. Today's rows are always at the end of the
+    file, so the startup lookup and date-range queries seek straight to the
+    relevant slice instead of reading the file from the top. The index is
+    checked against the CSV on first use and rebuilt if missing or stale.
+    """
+
+    extension = "csv"
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        # The CSV is written in the platform's default encoding
+        self.encoding = locale.getpreferredencoding(False)
+        self._runs = None
+        self._indexed_size = 0
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _date_of(self, line):
+        row = next(csv.reader([line.decode(self.encoding)]), [])
+        return row[3] if len(row) > 3 else None
+
+    def _scan_runs(self, start, last_date):
+        """Finds where the date changes between `start` and the end of the file."""
+        runs = []
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Half-written last line; picked up next time
+                date = self._date_of(line)
+                if date is not None and date != last_date:
+                    runs.append((date, offset))
+                    last_date = date
+                offset += len(line)
+        return runs, offset
+
+    def _run_is_valid(self, run):
+        date, offset = run
+        with open(self.path, "rb") as f:
+            if offset >= f.seek(0, os.SEEK_END):
+                return False
+            if offset > 0:
+                f.seek(offset - 1)
+                if f.read(1) != b"\n":
+                    return False
+            f.seek(offset)
+            return self._date_of(f.readline()) == date
+
+    def _read_index_file(self):
+        runs = []
+        try:
+            with open(self.index_path, "r", newline="") as f:
+                for date, offset in csv.reader(f):
+                    runs.append((date, int(offset)))
+        except (OSError, ValueError):
+            return []
+        return runs
+
+    def _rebuild_index(self):
+        with open(self.path, "rb") as f:
+            header_end = len(f.readline())
+        self._runs, self._indexed_size = self._scan_runs(header_end, None)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", newline="") as f:
+            csv.writer(f).writerows(self._runs)
+        os.replace(tmp_path, self.index_path)
+
+    def _append_runs(self, runs):
+        self._runs.extend(runs)
+        with open(self.index_path, "a", newline="") as f:
+            csv.writer(f).writerows(runs)
+
+    def _refresh_index(self):
+        """Brings the run index up to date with the CSV file."""
+        size = os.path.getsize(self.path)
+        if self._runs is None:
+            runs = self._read_index_file()
+            if not runs or not self._run_is_valid(runs[-1]):
+                self._rebuild_index()
+                return
+            self._runs, self._indexed_size = runs, runs[-1][1]
+        if size < self._indexed_size:
+            self._rebuild_index()  # The file was replaced or truncated
+        elif size > self._indexed_size:
+            last_date = self._runs[-1][0] if self._runs else None
+            runs, self._indexed_size = self._scan_runs(self._indexed_size, last_date)
+            if runs:
+                self._append_runs(runs)
+
+    def append(self, row):
+        with self._lock:
+            with open(self.path, "a", newline="") as f:
+                writer = csv.writer(f)
+                if os.stat(self.path).st_size == 0:
+                    writer.writerow(HEADER)
+                writer.writerow(row)
+            self._refresh_index()
+
+    def _slices(self, date_from, date_to):
+        """Yields the (start, end) byte ranges holding dates in the range."""
+        bounds = [offset for _, offset in self._runs[1:]] + [self._indexed_size]
+        for (date, start), end in zip(self._runs, bounds):
+            if date_from and date < date_from:
+                continue
+            if date_to and date > date_to:
+                continue
+            yield start, end
+
+    def rows(self, date_from=None, date_to=None, class_=None):
+        """Returns the attendance rows (without the header) as strings."""
+        if not self.exists():
+            return []
+        if not date_from and not date_to:
+            with open(self.path, "r", newline="") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                return list(filter_rows(reader, date_from, date_to, class_))
+
+        with self._lock:
+            self._refresh_index()
+            slices = list(self._slices(date_from, date_to))
+        rows = []
+        with open(self.path, "rb") as f:
+            for start, end in slices:
+                f.seek(start)
+                text = f.read(end - start).decode(self.encoding)
+                reader = csv.reader(io.StringIO(text, newline=""))
+                rows.extend(filter_rows(reader, date_from, date_to, class_))
+        return rows
+
+    def nis_on(self, date_str):
+        """Returns the NIS of everyone already marked on the given date."""
+        return {
+            row[0]
+            for row in self.rows(date_str, date_str)
+            if len(row) > 3 and row[3] == date_str
+        }
+
+    def export(self, export_path):
+        shutil.copy(self.path, export_path)
+
+    def close(self):
+        pass
+
+
+class XlsxStore:
+    """
+    Attendance kept in attendance.xlsx, written through an append-only journal.
+
+    Loading and saving the whole workbook for every student gets slower as the
+    year goes on, so append() only writes one CSV line to the journal. The
+    journal is copied into the workbook in the background (every
+    `flush_interval` seconds after a mark), and before the logs are exported.
+
+    The workbook remembers which journal it was brought up to date from and
+    how far (the "journal_id" and "journal_offset" document properties).
+    Both are saved with the workbook itself, so a crash at any point never
+    duplicates or loses a row. Reads combine the workbook with the journal
+    lines not yet copied.
+
+    The journal starts with a "#journal,<id>" line. After each flush it is
+    replaced by a new journal, with a new id, that holds only the lines not
+    yet copied. So a workbook that is deleted or archived does not bring back
+    the marks it already held, and the journal does not grow all year.
+    """
+
+    extension = "xlsx"
+    offset_property = "journal_offset"
+    id_property = "journal_id"
+    id_prefix = b"#journal,"
+
+    def __init__(self, path, journal_path, flush_interval=60.0):
+        self.path = path
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self._journal_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._tail_checked = False
+
+    def exists(self):
+        return os.path.exists(self.path) or bool(self._pending_rows()[0])
+
+    def _journal_needs_newline(self):
+        # A crash mid-write can leave a partial last line; never extend it
+        if not os.path.exists(self.journal_path):
+            return False
+        with open(self.journal_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def _new_journal_header(self):
+        return self.id_prefix + uuid.uuid4().hex.encode("ascii") + b"\n"
+
+    def append(self, row):
+        line = io.StringIO()
+        csv.writer(line).writerow(row)
+        with self._journal_lock:
+            prefix = ""
+            if not os.path.exists(self.journal_path) or not os.path.getsize(
+                self.journal_path
+            ):
+                prefix = self._new_journal_header().decode("ascii")
+                self._tail_checked = True
+            elif not self._tail_checked:
+                prefix = "\n" if self._journal_needs_newline() else ""
+                self._tail_checked = True
+            with open(self.journal_path, "a", encoding="utf-8", newline="") as f:
+                f.write(prefix + line.getvalue())
+                f.flush()
+                os.fsync(f.fileno())
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        with self._journal_lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        with self._journal_lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            # The rows are safe in the journal; the next flush will retry
+            print(f"Could not update {self.path}: {e}")
+
+    def _read_position(self, wb):
+        """Returns the (journal id, offset) the workbook is up to date with."""
+        props = wb.custom_doc_props
+        journal_id, offset = "", 0
+        if self.id_property in props.names:
+            journal_id = props[self.id_property].value
+        if self.offset_property in props.names:
+            offset = int(props[self.offset_property].value)
+        return journal_id, offset
+
+    def _workbook_position(self):
+        if not os.path.exists(self.path):
+            return None, 0
+        # openpyxl is imported on first use, it is slow to load at startup
+        from openpyxl import load_workbook
+
+        wb = load_workbook(self.path, read_only=True)
+        try:
+            return self._read_position(wb)
+        finally:
+            wb.close()
+
+    def _split_header(self, data):
+        """Returns (journal id, header length) of the journal contents."""
+        if not data.startswith(self.id_prefix):
+            return "", 0  # Written before journals had an id
+        end = data.find(b"\n") + 1
+        if not end:
+            return "", len(data)
+        return data[len(self.id_prefix) : end - 1].decode("ascii"), end
+
+    def _pending_rows(self, position=None):
+        """
+        Returns (rows, journal_id, end_offset) for the journal lines that the
+        workbook, up to date with `position` (journal id, offset), lacks.
+        A half-written last line is left for the next read.
+        """
+        if position is None:
+            position = self._workbook_position()
+        known_id, offset = position
+        if not os.path.exists(self.journal_path):
+            return [], "", 0
+        with open(self.journal_path, "rb") as f:
+            data = f.read()
+        journal_id, header_end = self._split_header(data)
+        if known_id != journal_id or offset > len(data):
+            # Another journal than the one the workbook was updated from
+            # (or no workbook at all): none of its lines were copied yet
+            offset = header_end
+        offset = max(offset, header_end)
+        data = data[offset:]
+        complete = data[: data.rfind(b"\n") + 1]
+        try:
+            text = complete.decode("utf-8")
+        except UnicodeDecodeError:
+            # Journals written before it was always UTF-8 used the locale's
+            # encoding; never let one accented name block the flush
+            text = complete.decode(locale.getpreferredencoding(False), "replace")
+        reader = csv.reader(io.StringIO(text, newline=""))
+        # Lines cut short by a crash are skipped
+        rows = [row for row in reader if len(row) == len(HEADER)]
+        return rows, journal_id, offset + len(complete)
+
+    def flush(self):
+        """Copies the pending journal lines into the workbook."""
+        from openpyxl import Workbook, load_workbook
+        from openpyxl.packaging.custom import IntProperty, StringProperty
+
+        with self._flush_lock:
+            if os.path.exists(self.path):
+                wb = load_workbook(self.path)
+                ws = wb.active
+            else:
+                wb = Workbook()
+                ws = wb.active
+                ws.append(HEADER)
+
+            rows, journal_id, end = self._pending_rows(self._read_position(wb))
+            if not rows and os.path.exists(self.path):
+                return
+            for row in rows:
+                ws.append(row)
+
+            props = wb.custom_doc_props
+            for name, value, kind in (
+                (self.id_property, journal_id, StringProperty),
+                (self.offset_property, end, IntProperty),
+            ):
+                if name in props.names:
+                    props[name].value = value
+                else:
+                    props.append(kind(name=name, value=value))
+
+            # Save next to the workbook and swap it in, so it is never torn
+            tmp_path = self.path + ".tmp"
+            wb.save(tmp_path)
+            os.replace(tmp_path, self.path)
+            self._rotate_journal(journal_id, end)
+
+    def _rotate_journal(self, journal_id, end):
+        """
+        Replaces the journal with a new one holding only the lines after
+        `end`, i.e. those appended while the workbook was being saved.
+        """
+        with self._journal_lock:
+            if not os.path.exists(self.journal_path):
+                return
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+            if self._split_header(data)[0] != journal_id:
+                return  # Replaced meanwhile; left as it is
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(self._new_journal_header() + data[end:])
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+
+    def _workbook_rows(self):
+        if not os.path.exists(self.path):
+            return [], (None, 0)
+        from openpyxl import load_workbook
+
+        wb = load_workbook(self.path, read_only=True)
+        try:
+            rows = [
+                [str(cell) if cell is not None else "" for cell in row]
+                for row in wb.active.iter_rows(min_row=2, values_only=True)
+            ]
+            return rows, self._read_position(wb)
+        finally:
+            wb.close()
+
+    def rows(self, date_from=None, date_to=None, class_=None):
+        """Returns the attendance rows (without the header) as strings."""
+        rows, position = self._workbook_rows()
+        rows += self._pending_rows(position)[0]
+        return list(filter_rows(rows, date_from, date_to, class_))
+
+    def nis_on(self, date_str):
+        """Returns the NIS of everyone already marked on the given date."""
+        return {
+            row[0]
+            for row in self.rows(date_str, date_str)
+            if len(row) > 3 and row[3] == date_str
+        }
+
+    def export(self, export_path):
+        self.flush()
+        shutil.copy(self.path, export_path)
+
+    def close(self):
+        """Cancels the pending timer and brings the workbook up to date."""
+        with self._journal_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if self._pending_rows()[0]:
+            self.flush()
+
+
+class SqliteStore:
+    """
+    Attendance kept in an SQLite database with (date, nis) and (class, date)
+    indexes, so the "already attended today" lookup at startup and the
+    filtered log views are indexed queries instead of full-file scans.
+    """
+
+    extension = "db"
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            # Used from the recognition loop and the GUI; guarded by _lock
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS attendance (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nis TEXT,
+                    name TEXT,
+                    class TEXT,
+                    date TEXT,
+                    time TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_attendance_date_nis
+                    ON attendance (date, nis);
+                CREATE INDEX IF NOT EXISTS idx_attendance_class_date
+                    ON attendance (class, date);
+                """)
+        return self._conn
+
+    def exists(self):
+        if not os.path.exists(self.path):
+            return False
+        with self._lock:
+            row = self._connect().execute("SELECT 1 FROM attendance LIMIT 1")
+            return row.fetchone() is not None
+
+    def append(self, row):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO attendance (nis, name, class, date, time) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [str(value) for value in row],
+                )
+
+    def rows(self, date_from=None, date_to=None, class_=None):
+        """Returns the attendance rows as strings, oldest first."""
+        clauses, params = [], []
+        if class_:
+            clauses.append("class = ?")
+            params.append(class_)
+        if date_from:
+            clauses.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("date <= ?")
+            params.append(date_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            cursor = self._connect().execute(
+                f"SELECT nis, name, class, date, time FROM attendance {where} "
+                "ORDER BY id",
+                params,
+            )
+            return [list(row) for row in cursor]
+
+    def nis_on(self, date_str):
+        """Returns the NIS of everyone already marked on the given date."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "SELECT nis FROM attendance WHERE date = ?", (date_str,)
+            )
+            return {row[0] for row in cursor}
+
+    def export(self, export_path):
+        # The backup API gives a consistent copy even while marks come in
+        with self._lock:
+            target = sqlite3.connect(export_path)
+            try:
+                self._connect().backup(target)
+            finally:
+                target.close()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def open_store(path, flush_interval=60.0):
+    """Returns the store for a log file, chosen by its extension."""
+    base, extension = os.path.splitext(path)
+    if extension == ".xlsx":
+        return XlsxStore(path, base + "_journal.csv", flush_interval)
+    if extension == ".db":
+        return SqliteStore(path)
+    if extension == ".csv":
+        return CsvStore(path)
+    raise ValueError(f"Unknown log format: {path} (use .csv, .xlsx or .db)")
@@ -0,0 +1,288 @@
+"""
+Benchmark of the recognition pipeline on a recorded video, without a webcam:
+
+    python benchmark.py --video hallway.mp4
+    python benchmark.py --video frames/ --galleries 100,1000 --output run.json
+
+Every frame goes through the same stages as in the engine (resize, color
+conversion, detection, encoding, matching and marking). The match stage is
+repeated against synthetic galleries of each requested size. The report is
+JSON: frames per second, p50/p95/p99 latency per stage, peak memory and the
+arrays allocated per frame by preprocessing, with and without the reused
+buffers of detection.FramePreprocessor.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import face_recognition
+import numpy as np
+
+from attendance_store import attendance_row, open_store
+from capture import open_source
+from detection import FramePreprocessor
+from encoder import make_encoder
+from matcher import make_matcher
+from settings import load_settings, settings_file
+
+GALLERY_SIZES = (100, 1000, 10000, 100000)
+STAGES = ("resize", "cvtColor", "detect", "encode", "match", "mark")
+# Frames on which the preprocessing allocations are traced
+ALLOCATION_FRAMES = 50
+
+
+def peak_rss_bytes():
+    """Returns the peak resident memory of this process, or None if unknown."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = Counters(cb=ctypes.sizeof(Counters))
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(
+            process, ctypes.byref(counters), counters.cb
+        ):
+            return None
+        return counters.PeakWorkingSetSize
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def latency_summary(seconds):
+    """Returns mean and p50/p95/p99 of a list of durations, in milliseconds."""
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def count_allocations(function, *args):
+    """
+    Calls function(*args) under tracemalloc and returns the number of numpy
+    arrays it allocated (still alive on return) and the peak bytes allocated.
+    """
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)]
+        )
+    finally:
+        tracemalloc.stop()
+    del result
+    return len(snapshot.traces), peak
+
+
+def allocating_preprocess(frame, scale):
+    """Preprocessing as it was before FramePreprocessor, for comparison."""
+    small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+    return small_frame, cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+
+
+def synthetic_gallery(size, rng):
+    """Random encodings spread like real ones (identities ~0.8 apart)."""
+    return rng.normal(0.0, 0.8 / np.sqrt(256), (size, 128))
+
+
+def run_benchmark(
+    video,
+    gallery_sizes=GALLERY_SIZES,
+    settings=None,
+    max_frames=None,
+    scale=0.25,
+    upsample=1,
+    tolerance=0.6,
+):
+    """Runs the pipeline stages over the frames of `video`; returns the report."""
+    settings = settings or load_settings()
+    rng = np.random.default_rng(0)
+    encoder = make_encoder(settings["encoder_workers"])
+
+    # Frame stages do not depend on the gallery, so they run once per frame;
+    # the match stage is repeated against every gallery size
+    timings = {stage: [] for stage in STAGES if stage != "match"}
+    frame_encodings = []
+    preprocess = FramePreprocessor()
+    allocations = {"buffered": [], "allocating": []}
+    source = open_source(video)
+    if not source.isOpened():
+        raise IOError(f"Could not open {video}")
+    person = {"nis": "0", "name": "Benchmark", "class": "-"}
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        store = open_store(os.path.join(log_dir, "attendance.csv"))
+        source.start()
+        try:
+            while max_frames is None or len(frame_encodings) < max_frames:
+                ret, frame = source.read()
+                if not ret:
+                    break
+                if len(frame_encodings) < ALLOCATION_FRAMES:
+                    # Traced outside the timed stages; tracemalloc is slow
+                    allocations["allocating"].append(
+                        count_allocations(allocating_preprocess, frame, scale)
+                    )
+                    allocations["buffered"].append(
+                        count_allocations(preprocess, frame, scale)
+                    )
+
+                start = time.perf_counter()
+                small_frame = preprocess.resize(frame, scale)
+                resized = time.perf_counter()
+                rgb_small_frame = preprocess.to_rgb(small_frame)
+                converted = time.perf_counter()
+                locations = face_recognition.face_locations(
+                    rgb_small_frame, number_of_times_to_upsample=upsample
+                )
+                detected = time.perf_counter()
+                encodings = encoder.encode(rgb_small_frame, locations)
+                encoded = time.perf_counter()
+                # One row per frame, so the log I/O is measured on every frame
+                store.append(attendance_row(person))
+                marked = time.perf_counter()
+
+                timings["resize"].append(resized - start)
+                timings["cvtColor"].append(converted - resized)
+                timings["detect"].append(detected - converted)
+                timings["encode"].append(encoded - detected)
+                timings["mark"].append(marked - encoded)
+                frame_encodings.append(encodings)
+        finally:
+            source.release()
+            store.close()
+            encoder.close()
+
+    frames = len(frame_encodings)
+    faces = sum(len(encodings) for encodings in frame_encodings)
+    frame_seconds = sum(sum(values) for values in timings.values())
+    report = {
+        "video": str(video),
+        "frames": frames,
+        "faces": faces,
+        "scale": scale,
+        "upsample": upsample,
+        "encoder_workers": settings["encoder_workers"],
+        "match_index": settings["match_index"],
+        "stages": {stage: latency_summary(values) for stage, values in timings.items()},
+        "preprocess_allocations": {
+            mode: {
+                "frames": len(counts),
+                "arrays_per_frame": (
+                    round(float(np.mean([arrays for arrays, _ in counts])), 2)
+                    if counts
+                    else 0.0
+                ),
+                "kb_per_frame": (
+                    round(float(np.mean([peak for _, peak in counts])) / 1024, 1)
+                    if counts
+                    else 0.0
+                ),
+            }
+            for mode, counts in allocations.items()
+        },
+        "galleries": {},
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+        },
+    }
+
+    for size in sorted(gallery_sizes):
+        matcher = make_matcher(
+            settings["match_index"],
+            synthetic_gallery(size, rng),
+            nprobe=settings["ivf_nprobe"],
+        )
+        match_seconds = []
+        for encodings in frame_encodings:
+            # Frames without a face still search the gallery with one probe,
+            # so a video without faces measures the match stage too
+            queries = encodings if len(encodings) else rng.normal(0.0, 0.05, (1, 128))
+            start = time.perf_counter()
+            matcher.match(queries, tolerance)
+            match_seconds.append(time.perf_counter() - start)
+        total = frame_seconds + sum(match_seconds)
+        peak = peak_rss_bytes()
+        report["galleries"][str(size)] = {
+            "fps": round(frames / total, 2) if total else 0.0,
+            "match": latency_summary(match_seconds),
+            "peak_rss_mb": round(peak / 2**20, 1) if peak else None,
+        }
+        del matcher
+
+    peak = peak_rss_bytes()
+    report["peak_rss_mb"] = round(peak / 2**20, 1) if peak else None
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--video", required=True, help="Video file or directory of images."
+    )
+    parser.add_argument(
+        "--galleries",
+        default=",".join(str(size) for size in GALLERY_SIZES),
+        help="Comma-separated synthetic gallery sizes.",
+    )
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--scale", type=float, default=0.25)
+    parser.add_argument("--upsample", type=int, default=1)
+    parser.add_argument("--settings", default=settings_file)
+    parser.add_argument("--output", help="Write the JSON report here too.")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        args.video,
+        gallery_sizes=[int(size) for size in args.galleries.split(",")],
+        settings=load_settings(args.settings),
+        max_frames=args.max_frames,
+        scale=args.scale,
+        upsample=args.upsample,
+    )
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""Camera capture running on its own thread so recognition always sees fresh frames."""
+
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+
+# Modes tried by probe_modes() when none are given
+PROBE_SIZES = ((320, 240), (640, 480), (800, 600), (1280, 720), (1920, 1080))
+PROBE_FOURCCS = ("MJPG", "YUYV")
+
+
+def camera_properties(settings):
+    """Returns the camera_* station settings as open_camera() properties."""
+    return {
+        "width": settings["camera_width"],
+        "height": settings["camera_height"],
+        "fps": settings["camera_fps"],
+        "fourcc": settings["camera_fourcc"],
+        "buffer_size": settings["camera_buffer_size"],
+    }
+
+
+def fourcc_name(code):
+    """Turns a CAP_PROP_FOURCC value back into its four letters."""
+    code = int(code)
+    return "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\x00")
+
+
+def camera_mode(cap):
+    """Returns the mode the driver actually gave us, as a dict."""
+    return {
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": round(cap.get(cv2.CAP_PROP_FPS), 1),
+        "fourcc": fourcc_name(cap.get(cv2.CAP_PROP_FOURCC)),
+    }
+
+
+def open_camera(index=0, width=0, height=0, fps=0, fourcc="", buffer_size=0):
+    """
+    Opens a webcam and requests a capture mode. Zero or empty values keep the
+    driver default. Drivers silently fall back for modes they do not support,
+    so check camera_mode() for what was actually applied.
+    """
+    cap = cv2.VideoCapture(index)
+    if not cap.isOpened():
+        return cap
+    # The pixel format has to be set before the size on most drivers
+    if fourcc:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    if width and height:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    if fps:
+        cap.set(cv2.CAP_PROP_FPS, fps)
+    if buffer_size:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+    return cap
+
+
+class FrameGrabber:
+    """
+    Reads frames from a cv2.VideoCapture on a background thread into a small
+    bounded ring buffer. read() always hands back the newest frame and counts
+    the older ones it skipped, so a slow recognition step never works on
+    frames that have been sitting in the camera buffer for seconds.
+
+    The interface mirrors cv2.VideoCapture (isOpened/read/release), so it can
+    be used as a drop-in replacement in the recognition loop. `properties`
+    are passed to open_camera() (resolution, fps, fourcc, buffer size).
+
+    With mode="grab" the thread only grab()s frames, which keeps the camera
+    drained without decoding them, and retrieve()s (decodes) one when read()
+    is waiting for it. Frames that recognition would skip anyway are never
+    decoded, which saves most of the decode work on MJPEG cameras when
+    recognition is slower than the camera. In grab mode `target_fps` also
+    caps how many frames per second are decoded and handed out (0 = as fast
+    as read() asks for them).
+    """
+
+    def __init__(
+        self,
+        source=0,
+        buffer_size=2,
+        read_timeout=2.0,
+        properties=None,
+        mode="read",
+        target_fps=0,
+    ):
+        self.cap = open_camera(source, **(properties or {}))
+        self.read_timeout = read_timeout
+        self.mode = mode
+        self.target_fps = target_fps
+        self._frames = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._finished = False
+        self._readers = 0
+        self._next_due = 0.0
+
+        # Counters, readable at any time (see stats())
+        self.frames_captured = 0
+        self.frames_decoded = 0
+        self.frames_delivered = 0
+        self.frames_dropped = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        """Starts the capture thread. Safe to call more than once."""
+        if self._thread is not None:
+            return self
+        self._running = True
+        loop = self._grab_loop if self.mode == "grab" else self._capture_loop
+        self._thread = threading.Thread(target=loop, name="FrameGrabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def _capture_loop(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            with self._cond:
+                if not ret:
+                    self._finished = True
+                    self._cond.notify_all()
+                    return
+                if len(self._frames) == self._frames.maxlen:
+                    # The oldest frame is overwritten without ever being used
+                    self.frames_dropped += 1
+                self._frames.append(frame)
+                self.frames_captured += 1
+                self.frames_decoded += 1
+                self._cond.notify_all()
+
+    def _grab_loop(self):
+        while self._running:
+            grabbed = self.cap.grab()
+            with self._cond:
+                if grabbed:
+                    self.frames_captured += 1
+                wanted = (
+                    grabbed
+                    and self._readers
+                    and not self._frames
+                    and time.monotonic() >= self._next_due
+                )
+                if grabbed and not wanted:
+                    # Advanced past without ever decoding it
+                    self.frames_dropped += 1
+                    continue
+            ret, frame = self.cap.retrieve() if grabbed else (False, None)
+            with self._cond:
+                if not ret:
+                    self._finished = True
+                    self._cond.notify_all()
+                    return
+                if self.target_fps:
+                    self._next_due = time.monotonic() + 1.0 / self.target_fps
+                self._frames.append(frame)
+                self.frames_decoded += 1
+                self._cond.notify_all()
+
+    def read(self):
+        """
+        Returns (True, frame) with the newest captured frame, waiting for one
+        if the buffer is empty. Returns (False, None) when the camera stops
+        delivering frames.
+        """
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            # In grab mode the capture thread decodes a frame for us now
+            self._readers += 1
+            self._cond.wait_for(
+                lambda: self._frames or self._finished, timeout=self.read_timeout
+            )
+            self._readers -= 1
+            if not self._frames:
+                return False, None
+            frame = self._frames.pop()
+            # Anything older than the newest frame is stale by now
+            self.frames_dropped += len(self._frames)
+            self._frames.clear()
+            self.frames_delivered += 1
+            return True, frame
+
+    def stats(self):
+        """Returns the capture counters as a dict."""
+        with self._cond:
+            captured = self.frames_captured
+            return {
+                "captured": captured,
+                "decoded": self.frames_decoded,
+                "delivered": self.frames_delivered,
+                "dropped": self.frames_dropped,
+                "drop_ratio": self.frames_dropped / captured if captured else 0.0,
+            }
+
+    def release(self):
+        """Stops the capture thread and releases the camera."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=self.read_timeout)
+            self._thread = None
+        self.cap.release()
+
+
+class VideoFileSource:
+    """
+    Frames of a recorded video, read in order without dropping any, so a run
+    over the same file always processes the same frames. Same interface as
+    FrameGrabber.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        self.frames_delivered = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        return self
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if ret:
+            self.frames_delivered += 1
+        return ret, frame
+
+    def stats(self):
+        return {
+            "captured": self.frames_delivered,
+            "decoded": self.frames_delivered,
+            "delivered": self.frames_delivered,
+            "dropped": 0,
+            "drop_ratio": 0.0,
+        }
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(VideoFileSource):
+    """The images of a directory as frames, in file name order."""
+
+    extensions = (".jpg", ".jpeg", ".png", ".bmp")
+
+    def __init__(self, path):
+        self.path = path
+        self.files = sorted(
+            os.path.join(path, name)
+            for name in os.listdir(path)
+            if name.lower().endswith(self.extensions)
+        )
+        self.frames_delivered = 0
+        self._next = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self):
+        while self._next < len(self.files):
+            frame = cv2.imread(self.files[self._next])
+            self._next += 1
+            if frame is not None:
+                self.frames_delivered += 1
+                return True, frame
+            print(f"Warning: Could not read {self.files[self._next - 1]}.")
+        return False, None
+
+    def release(self):
+        self._next = len(self.files)
+
+
+def open_source(source=0, properties=None, mode="read", target_fps=0):
+    """
+    Returns the frame source for a webcam index (live, newest frame first),
+    a video file or a directory of images. `properties`, `mode` and
+    `target_fps` only apply to webcams (see FrameGrabber).
+    """
+    if isinstance(source, int) or str(source).isdigit():
+        return FrameGrabber(
+            int(source), properties=properties, mode=mode, target_fps=target_fps
+        )
+    if os.path.isdir(source):
+        return ImageDirectorySource(source)
+    return VideoFileSource(source)
+
+
+def measure_mode(cap, seconds=2.0):
+    """
+    Reads from an open camera for `seconds` and returns the delivered frames
+    per second and the average cost of grab() and retrieve() (the decode) in
+    milliseconds.
+    """
+    frames, grab_seconds, retrieve_seconds = 0, 0.0, 0.0
+    cap.read()  # The first frame often takes much longer
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        t = time.perf_counter()
+        if not cap.grab():
+            break
+        grabbed = time.perf_counter()
+        ret, _ = cap.retrieve()
+        if not ret:
+            break
+        grab_seconds += grabbed - t
+        retrieve_seconds += time.perf_counter() - grabbed
+        frames += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "delivered_fps": round(frames / elapsed, 1) if elapsed else 0.0,
+        "grab_ms": round(1000 * grab_seconds / frames, 2) if frames else None,
+        "decode_ms": round(1000 * retrieve_seconds / frames, 2) if frames else None,
+    }
+
+
+def probe_modes(index=0, sizes=PROBE_SIZES, fourccs=PROBE_FOURCCS, fps=30, seconds=2.0):
+    """
+    Requests each size/fourcc combination from the camera and measures the
+    modes the driver accepted. OpenCV cannot list a camera's modes, so the
+    distinct modes actually applied are what the camera supports.
+    Returns one dict per distinct mode.
+    """
+    results = []
+    seen = set()
+    for fourcc in fourccs:
+        for width, height in sizes:
+            cap = open_camera(index, width, height, fps, fourcc)
+            try:
+                if not cap.isOpened():
+                    raise IOError(f"Could not open camera {index}")
+                mode = camera_mode(cap)
+                key = tuple(mode.values())
+                if key in seen:
+                    continue
+                seen.add(key)
+                result = {"requested": f"{width}x{height} {fourcc}", **mode}
+                result.update(measure_mode(cap, seconds))
+                results.append(result)
+            finally:
+                cap.release()
+    return results
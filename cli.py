@@ -0,0 +1,161 @@
+"""
+Command line entry point for running recognition without the GUI, e.g.
+
+    python cli.py recognize --source 0
+    python cli.py recognize --source hallway.mp4 --output /tmp/test.csv
+    python cli.py recognize --source frames/ --tolerance 0.5 --max-frames 300
+    python cli.py probe-camera --camera 0
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from attendance_store import open_store
+from settings import data_dir, load_settings, settings_file
+
+
+def recognize(args):
+    from capture import camera_properties, open_source
+    from engine import RecognitionEngine
+    from gallery import Gallery
+    from matcher import make_matcher
+
+    settings = load_settings(args.settings)
+    try:
+        store = open_store(args.output, settings["xlsx_flush_seconds"])
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    gallery = Gallery(args.data_dir)
+    # Stations set up before the gallery files only have the old pickle
+    gallery.migrate_pickle(os.path.join(args.data_dir, "encodings.pkl"))
+    encodings, person_data = gallery.load()
+    if not person_data:
+        print(f"Warning: No registered faces in {args.data_dir}.")
+    index = make_matcher(
+        settings["match_index"], encodings, nprobe=settings["ivf_nprobe"]
+    )
+
+    source = open_source(
+        args.source,
+        camera_properties(settings),
+        mode=settings["capture_mode"],
+        target_fps=settings["capture_fps"],
+    )
+    if not source.isOpened():
+        source.release()
+        store.close()
+        print(f"Error: Could not open {args.source}.")
+        return 1
+
+    engine = RecognitionEngine(
+        index, person_data, store, settings, tolerance=args.tolerance
+    )
+    try:
+        engine.load_marks()
+    except Exception as e:
+        print(f"Error: Could not read {args.output}: {e}")
+
+    if args.profile:
+        engine.profiler.request(args.profile)
+    print(f"Recognizing faces from {args.source}, press Ctrl+C to stop.")
+    try:
+        engine.run(source, max_frames=args.max_frames)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
+        store.close()
+    print(engine.report())
+    return 0
+
+
+def probe_camera(args):
+    from capture import PROBE_FOURCCS, PROBE_SIZES, probe_modes
+
+    sizes = PROBE_SIZES
+    if args.sizes:
+        sizes = [tuple(map(int, size.split("x"))) for size in args.sizes.split(",")]
+    fourccs = args.fourccs.split(",") if args.fourccs else PROBE_FOURCCS
+    print(f"Probing camera {args.camera}, {args.seconds:g}s per mode...")
+    try:
+        modes = probe_modes(args.camera, sizes, fourccs, args.fps, args.seconds)
+    except IOError as e:
+        print(f"Error: {e}")
+        return 1
+    if args.json:
+        print(json.dumps(modes, indent=2))
+        return 0
+
+    print(
+        f"{'mode':>18} {'camera fps':>10} {'delivered':>9} "
+        f"{'grab ms':>8} {'decode ms':>9} {'detect at 0.25':>14}"
+    )
+    for mode in modes:
+        name = f"{mode['width']}x{mode['height']} {mode['fourcc']}"
+        # The detector sees the frame at the default 0.25 scale
+        small = f"{mode['width'] // 4}x{mode['height'] // 4}"
+        print(
+            f"{name:>18} {mode['fps']:>10g} {mode['delivered_fps']:>9g} "
+            f"{mode['grab_ms'] or 0:>8.2f} {mode['decode_ms'] or 0:>9.2f} "
+            f"{small:>14}"
+        )
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Face recognition attendance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser(
+        "recognize", help="Recognize faces and mark attendance, without the GUI."
+    )
+    run.add_argument(
+        "--source",
+        default="0",
+        help="Webcam index, video file or directory of images (default: 0).",
+    )
+    run.add_argument("--tolerance", type=float, default=0.6)
+    run.add_argument(
+        "--output",
+        default=os.path.join(data_dir, "attendance.csv"),
+        help="Attendance log to append to: .csv, .xlsx or .db.",
+    )
+    run.add_argument("--max-frames", type=int, help="Stop after this many frames.")
+    run.add_argument(
+        "--profile",
+        type=float,
+        metavar="SECONDS",
+        help="Profile the first SECONDS of the loop into data/ (cProfile).",
+    )
+    run.add_argument("--data-dir", default=data_dir, help="Registered faces.")
+    run.add_argument("--settings", default=settings_file)
+    run.set_defaults(handler=recognize)
+
+    probe = commands.add_parser(
+        "probe-camera",
+        help="List the capture modes of a webcam with their delivered FPS "
+        "and decode cost.",
+    )
+    probe.add_argument("--camera", type=int, default=0)
+    probe.add_argument(
+        "--sizes", help="Comma-separated sizes to try, e.g. 640x480,1280x720."
+    )
+    probe.add_argument(
+        "--fourccs", help="Comma-separated pixel formats to try (default MJPG,YUYV)."
+    )
+    probe.add_argument("--fps", type=int, default=30, help="FPS to request.")
+    probe.add_argument(
+        "--seconds", type=float, default=2.0, help="Measuring time per mode."
+    )
+    probe.add_argument("--json", action="store_true")
+    probe.set_defaults(handler=probe_camera)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""Helpers that decide when and how face detection runs on a frame."""
+
+import time
+
+import cv2
+import numpy as np
+
+
+def scale_boxes(face_locations, factor):
+    """Scales (top, right, bottom, left) boxes, e.g. from the small frame back up."""
+    return [
+        (
+            int(round(top * factor)),
+            int(round(right * factor)),
+            int(round(bottom * factor)),
+            int(round(left * factor)),
+        )
+        for top, right, bottom, left in face_locations
+    ]
+
+
+class FramePreprocessor:
+    """
+    Downscales BGR frames and converts them to RGB for detection without
+    allocating a new array per frame. The frame is resized straight into a
+    preallocated buffer and swapped to RGB in place, so one contiguous buffer
+    serves every frame and dlib reads it without a copy. A new buffer is only
+    allocated when the frame size or scale changes (counted in allocations).
+
+    The returned array is overwritten by the next frame. Anything that must
+    outlive the frame has to take a copy.
+    """
+
+    def __init__(self):
+        self._buffer = None
+        self.allocations = 0
+
+    def resize(self, frame, scale):
+        """Returns the BGR frame downscaled by `scale`, in the shared buffer."""
+        height, width = frame.shape[:2]
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        shape = (size[1], size[0], frame.shape[2])
+        if self._buffer is None or self._buffer.shape != shape:
+            self._buffer = np.empty(shape, dtype=frame.dtype)
+            self.allocations += 1
+        return cv2.resize(frame, size, dst=self._buffer, interpolation=cv2.INTER_LINEAR)
+
+    @staticmethod
+    def to_rgb(small_frame):
+        """Swaps BGR to RGB in place and returns the same array."""
+        return cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB, dst=small_frame)
+
+    def __call__(self, frame, scale):
+        """Returns the downscaled RGB frame, in the shared buffer."""
+        return self.to_rgb(self.resize(frame, scale))
+
+
+class MotionGate:
+    """
+    Cheap frame differencing on the downscaled frame, used to skip face
+    detection entirely while the doorway is empty and nothing moves.
+
+    A frame counts as motion when more than `area_threshold` (a fraction of
+    the pixels) changed by more than `pixel_threshold` grey levels since the
+    previous frame. After motion, or whenever faces are in view (see wake()),
+    detection keeps running for `wake_seconds`.
+    """
+
+    def __init__(
+        self, pixel_threshold=25, area_threshold=0.01, wake_seconds=2.0, width=160
+    ):
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.wake_seconds = wake_seconds
+        self.width = width
+        self._previous = None
+        self._awake_until = 0.0
+
+        self.frames = 0
+        self.skipped = 0
+
+    def _prepare(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        if gray.shape[1] > self.width:
+            height = max(1, gray.shape[0] * self.width // gray.shape[1])
+            gray = cv2.resize(gray, (self.width, height), interpolation=cv2.INTER_AREA)
+        # Blurring keeps sensor noise from counting as motion
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, frame):
+        """Returns True when face detection should run on this frame."""
+        now = time.monotonic()
+        gray = self._prepare(frame)
+        previous, self._previous = self._previous, gray
+        self.frames += 1
+
+        if previous is None or previous.shape != gray.shape:
+            moved = True
+        else:
+            diff = cv2.absdiff(gray, previous)
+            _, changed = cv2.threshold(
+                diff, self.pixel_threshold, 255, cv2.THRESH_BINARY
+            )
+            moved = cv2.countNonZero(changed) >= self.area_threshold * changed.size
+
+        if moved:
+            # The wake window only covers the frames after this one
+            self._awake_until = now + self.wake_seconds
+            return True
+        if now < self._awake_until:
+            return True
+        self.skipped += 1
+        return False
+
+    def wake(self):
+        """Keeps detection running, e.g. while a student stands still in view."""
+        self._awake_until = max(self._awake_until, time.monotonic() + self.wake_seconds)
+
+    def stats(self):
+        """Returns the gate counters as a dict."""
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_ratio": self.skipped / self.frames if self.frames else 0.0,
+        }
+
+
+class AdaptiveScaler:
+    """
+    Picks the detection scale and number_of_times_to_upsample from the
+    measured frame latency and the size of the faces seen recently.
+
+    HOG detection only finds faces of roughly 80 px or more, and every upsample
+    doubles the apparent size at about four times the cost. The controller
+    keeps the smallest recent face at least `min_face_px` tall in the image
+    that is searched, and otherwise trades detail for speed to hold
+    `target_fps`. Scale and upsample stay within their floor/ceiling values.
+
+    While no face has been seen the magnification never drops below the one
+    it started with, since faces too small for the reduced settings would
+    never be found to raise it again. Below that starting point it steps back
+    up whenever the latency leaves plenty of headroom.
+    """
+
+    def __init__(
+        self,
+        target_fps=10.0,
+        scale=0.25,
+        upsample=1,
+        min_scale=0.2,
+        max_scale=0.5,
+        min_upsample=0,
+        max_upsample=2,
+        min_face_px=80,
+        step=0.05,
+        adjust_every=15,
+        face_memory=60,
+    ):
+        self.target_fps = target_fps
+        self.min_scale, self.max_scale = min_scale, max_scale
+        self.min_upsample, self.max_upsample = min_upsample, max_upsample
+        self.scale = min(max(scale, min_scale), max_scale)
+        self.upsample = min(max(upsample, min_upsample), max_upsample)
+        self.start_magnification = self.magnification
+        self.min_face_px = min_face_px
+        self.step = step
+        self.adjust_every = adjust_every
+        self.face_memory = face_memory
+
+        self.latency = None
+        self._frames = 0
+        self._smallest_face = None
+        self._frames_without_faces = 0
+        self.adjustments = 0
+
+    @property
+    def magnification(self):
+        """How much bigger a full-frame face appears to the detector."""
+        return self.scale * 2**self.upsample
+
+    def update(self, frame_seconds, face_heights):
+        """
+        Records one processed frame (its latency and the heights of the faces
+        found, in full-frame pixels). Returns True when scale or upsample
+        changed, in which case boxes from earlier frames must be rescaled.
+        """
+        self.latency = (
+            frame_seconds
+            if self.latency is None
+            else 0.8 * self.latency + 0.2 * frame_seconds
+        )
+        if face_heights:
+            smallest = min(face_heights)
+            if self._smallest_face is None or smallest < self._smallest_face:
+                self._smallest_face = smallest
+            self._frames_without_faces = 0
+        else:
+            self._frames_without_faces += 1
+            if self._frames_without_faces > self.face_memory:
+                self._smallest_face = None
+
+        self._frames += 1
+        if self._frames % self.adjust_every:
+            return False
+
+        before = (self.scale, self.upsample)
+        budget = 1.0 / self.target_fps
+        # With no face in view there is nothing to tell how small the next
+        # one will be; hold the starting magnification until one shows up
+        needed = self.start_magnification
+        if self._smallest_face:
+            needed = self.min_face_px / self._smallest_face
+
+        if self.magnification < needed and self.latency < 0.75 * budget:
+            self._increase()
+        elif (
+            self.magnification < self.start_magnification
+            and self.latency < 0.5 * budget
+        ):
+            self._increase()
+        elif self.latency > budget:
+            self._decrease(needed)
+        # Start over, so the next decision sees faces at the new settings
+        self._smallest_face = None
+
+        if (self.scale, self.upsample) != before:
+            self.adjustments += 1
+            return True
+        return False
+
+    def _increase(self):
+        if self.scale < self.max_scale:
+            self.scale = round(min(self.scale + self.step, self.max_scale), 3)
+        elif self.upsample < self.max_upsample:
+            self.upsample += 1
+
+    def _decrease(self, needed):
+        # Dropping an upsample saves the most, as long as faces stay findable
+        if self.upsample > self.min_upsample and self.magnification / 2 >= needed:
+            self.upsample -= 1
+            return
+        scale = round(max(self.scale - self.step, self.min_scale), 3)
+        if scale * 2**self.upsample >= needed:
+            self.scale = scale
+
+    def stats(self):
+        """Returns the controller state as a dict."""
+        return {
+            "scale": self.scale,
+            "upsample": self.upsample,
+            "latency_ms": (self.latency or 0.0) * 1000,
+            "adjustments": self.adjustments,
+        }
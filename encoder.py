@@ -0,0 +1,123 @@
+"""Face encoding, either inline or spread over a pool of worker processes."""
+
+import multiprocessing
+import os
+import time
+
+import cv2
+import face_recognition
+
+from detection import scale_boxes
+from warmup import warm_up_models
+
+# Extra context kept around each face crop, as a fraction of the box size.
+# The landmark model looks slightly outside the detected box.
+CROP_MARGIN = 0.25
+
+
+def crop_face(image, location, margin=CROP_MARGIN):
+    """
+    Cuts a face out of the image with some margin and returns the crop together
+    with the face location translated into crop coordinates.
+    """
+    top, right, bottom, left = location
+    pad_y = int((bottom - top) * margin)
+    pad_x = int((right - left) * margin)
+    height, width = image.shape[:2]
+    y0, y1 = max(top - pad_y, 0), min(bottom + pad_y, height)
+    x0, x1 = max(left - pad_x, 0), min(right + pad_x, width)
+    crop = image[y0:y1, x0:x1]
+    return crop, (top - y0, right - x0, bottom - y0, left - x0)
+
+
+def full_resolution_crops(bgr_frame, small_locations, scale):
+    """
+    Maps face boxes found on the downscaled frame back to the full-resolution
+    frame and cuts an RGB crop around each one. Only the crops are converted,
+    so the cost grows with the number of faces rather than the frame size.
+    """
+    tasks = []
+    for location in scale_boxes(small_locations, 1.0 / scale):
+        crop, crop_location = crop_face(bgr_frame, location)
+        tasks.append((cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), crop_location))
+    return tasks
+
+
+def _init_worker():
+    """
+    Runs once in each worker process: loads the dlib models and runs them once,
+    so the first frame sent to this worker is encoded at full speed.
+    """
+    start = time.perf_counter()
+    warm_up_models()
+    print(
+        f"Encoder worker {os.getpid()} warmed up in "
+        f"{time.perf_counter() - start:.2f}s"
+    )
+
+
+def _encode_crop(task):
+    crop, location = task
+    return face_recognition.face_encodings(crop, [location])[0]
+
+
+class InlineEncoder:
+    """Encodes faces on the calling thread, exactly like face_encodings()."""
+
+    workers = 0
+
+    def encode(self, rgb_image, face_locations):
+        return face_recognition.face_encodings(rgb_image, face_locations)
+
+    def encode_crops(self, tasks):
+        """Encodes (rgb_crop, location) pairs as made by crop_face()."""
+        return [_encode_crop(task) for task in tasks]
+
+    def encode_full_resolution(self, bgr_frame, small_locations, scale):
+        """Encodes faces detected on the small frame from full-resolution crops."""
+        return self.encode_crops(
+            full_resolution_crops(bgr_frame, small_locations, scale)
+        )
+
+    def close(self):
+        pass
+
+
+class EncoderPool(InlineEncoder):
+    """
+    Encodes the faces of a frame in parallel on a pool of worker processes,
+    each with the dlib models already loaded. Only the face crops are sent to
+    the workers and the encodings come back in the order of face_locations.
+
+    A single face is still encoded inline, since shipping it to a worker would
+    cost more than it saves.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        # "spawn" behaves the same on Windows and Linux, and avoids forking a
+        # process that already runs Tk and the capture thread
+        context = multiprocessing.get_context("spawn")
+        self._pool = context.Pool(self.workers, initializer=_init_worker)
+
+    def encode(self, rgb_image, face_locations):
+        if len(face_locations) < 2:
+            return face_recognition.face_encodings(rgb_image, face_locations)
+        tasks = [crop_face(rgb_image, location) for location in face_locations]
+        return self._pool.map(_encode_crop, tasks)
+
+    def encode_crops(self, tasks):
+        if len(tasks) < 2:
+            return super().encode_crops(tasks)
+        return self._pool.map(_encode_crop, tasks)
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+
+def make_encoder(workers=0):
+    """Returns an EncoderPool when workers > 0, otherwise an InlineEncoder."""
+    if workers and workers > 0:
+        return EncoderPool(workers)
+    return InlineEncoder()
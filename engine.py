@@ -0,0 +1,352 @@
+"""
+Headless recognition engine: frames in, attendance marks out.
+
+The engine holds the whole recognition pipeline (detection, encoding,
+matching, tracking and the optional adaptive scale and motion gate) without
+any GUI, so it runs the same in the Tk app, from cli.py on a headless box and
+in benchmarks.
+"""
+
+import datetime
+import time
+from collections import namedtuple
+
+import cv2
+import face_recognition
+
+from attendance_store import attendance_row
+from detection import AdaptiveScaler, FramePreprocessor, MotionGate, scale_boxes
+from encoder import make_encoder
+from metrics import PipelineMetrics
+from profiler import LoopProfiler
+from roster import RosterMatcher
+from tracker import FaceTracker
+
+# One face found in a frame: its box in full-frame coordinates, the Match and
+# the registered person it matched (None for an unknown face)
+Face = namedtuple("Face", ["box", "match", "person"])
+
+
+class RecognitionEngine:
+    """
+    Recognizes the faces of each frame against the gallery and appends one
+    attendance row per student and day to `sink` (an attendance store, or
+    anything with append(row) and nis_on(date_str)).
+
+    `tolerance` may be changed between frames, e.g. from a slider.
+    """
+
+    def __init__(self, index, person_data, sink, settings, tolerance=0.6):
+        self.person_data = person_data
+        self.sink = sink
+        self.settings = settings
+        self.tolerance = tolerance
+        self.marked_nis = set()
+
+        self.matcher = index
+        if settings["session_schedule"]:
+            # Students expected at the current session are searched first
+            self.matcher = RosterMatcher(
+                index, person_data, settings["session_schedule"]
+            )
+        # Optional pool of worker processes so groups of faces encode in parallel
+        self.encoder = make_encoder(settings["encoder_workers"])
+        # In tracking mode faces are detected every few frames and identities
+        # are kept per track, so a student is encoded once instead of every frame
+        self.tracker = None
+        if settings["tracking"]:
+            self.tracker = FaceTracker(
+                detect_every=settings["detect_every"],
+                backend=settings["tracker_backend"],
+                reverify_every=settings["reverify_every"],
+            )
+        # Faces are detected on a downscaled (and possibly upsampled) copy of
+        # each frame. The adaptive controller retunes both to hold the target FPS.
+        self.scale, self.upsample = 0.25, 1
+        self.scaler = None
+        if settings["adaptive_scale"]:
+            self.scaler = AdaptiveScaler(
+                target_fps=settings["target_fps"],
+                scale=self.scale,
+                upsample=self.upsample,
+                min_scale=settings["scale_min"],
+                max_scale=settings["scale_max"],
+                min_upsample=settings["upsample_min"],
+                max_upsample=settings["upsample_max"],
+            )
+            self.scale, self.upsample = self.scaler.scale, self.scaler.upsample
+        self.gate = None
+        if settings["motion_gate"]:
+            self.gate = MotionGate(
+                pixel_threshold=settings["motion_pixel_threshold"],
+                area_threshold=settings["motion_area_threshold"],
+                wake_seconds=settings["motion_wake_seconds"],
+            )
+
+        # Reused buffer for the downscaled RGB frame (no allocation per frame)
+        self.preprocess = FramePreprocessor()
+
+        self.source = None
+        self.frames = 0
+        self.faces = 0
+        self.marks = 0
+        self.seconds = 0.0  # Spent in process()
+        self.elapsed = 0.0  # Wall clock of run(), display included
+        # Time per stage; callers add their own stages (drawing, display)
+        self.metrics = PipelineMetrics()
+        self.metrics_file = settings["metrics_file"]
+        self.metrics_interval = settings["metrics_interval"]
+        self._metrics_written = 0.0
+        # cProfile of the loop on request (hotkey or --profile), off by default
+        self.profiler = LoopProfiler(seconds=settings["profile_seconds"])
+
+    def load_marks(self, date_str=None):
+        """Reads who already attended today, so nobody is marked twice."""
+        date_str = date_str or datetime.datetime.now().strftime("%Y-%m-%d")
+        self.marked_nis = set(self.sink.nis_on(date_str))
+
+    def _encode(self, frame, rgb_small_frame, locations):
+        if self.settings["encode_full_resolution"]:
+            # Sharper encodings from full-resolution crops of the same faces
+            return self.encoder.encode_full_resolution(frame, locations, self.scale)
+        return self.encoder.encode(rgb_small_frame, locations)
+
+    def _detect(self, rgb_small_frame):
+        return face_recognition.face_locations(
+            rgb_small_frame, number_of_times_to_upsample=self.upsample
+        )
+
+    def process(self, frame):
+        """
+        Recognizes the faces in one BGR frame, marks attendance for newly
+        recognized students and returns the faces as a list of Face.
+        """
+        metrics = self.metrics
+        frame_start = t = time.perf_counter()
+        scale, tolerance = self.scale, self.tolerance
+        small_frame = self.preprocess.resize(frame, scale)
+        t = metrics.lap("resize", t)
+        rgb_small_frame = self.preprocess.to_rgb(small_frame)
+        t = metrics.lap("cvtColor", t)
+        # Skip detection altogether while nothing moves in front of the camera
+        motion = True
+        if self.gate is not None:
+            motion = self.gate.check(rgb_small_frame)
+            t = metrics.lap("motion", t)
+
+        tracker = self.tracker
+        if tracker is None:
+            face_locations = []
+            if motion:
+                face_locations = self._detect(rgb_small_frame)
+                t = metrics.lap("face_locations", t)
+            if face_locations:
+                face_encodings = self._encode(frame, rgb_small_frame, face_locations)
+                t = metrics.lap("face_encodings", t)
+                # Match every face in the frame against the gallery in one pass
+                matches = self.matcher.match(face_encodings, tolerance)
+                t = metrics.lap("matching", t)
+            else:
+                matches = []
+            results = list(zip(face_locations, matches))
+        else:
+            if motion and tracker.due_for_detection():
+                face_locations = self._detect(rgb_small_frame)
+                t = metrics.lap("face_locations", t)
+                # Only faces that are new or still unknown get encoded
+                pending = tracker.update(rgb_small_frame, face_locations)
+                t = metrics.lap("tracking", t)
+                if pending:
+                    face_encodings = self._encode(
+                        frame, rgb_small_frame, [track.box for track in pending]
+                    )
+                    t = metrics.lap("face_encodings", t)
+                    for track, match in zip(
+                        pending, self.matcher.match(face_encodings, tolerance)
+                    ):
+                        track.resolve(match)
+                    t = metrics.lap("matching", t)
+            else:
+                tracker.follow(rgb_small_frame)
+                t = metrics.lap("tracking", t)
+            results = [
+                (track.box, track.match)
+                for track in tracker.tracks
+                if track.missed == 0
+            ]
+        if self.gate is not None and results:
+            # Students standing still in view must keep detection running
+            self.gate.wake()
+
+        faces = []
+        for box, match in results:
+            person = None
+            if match.is_match:
+                person = self.person_data[match.index]
+                if person["nis"] not in self.marked_nis:
+                    self.mark(person)
+                    t = metrics.lap("mark_attendance", t)
+            # Boxes are in small-frame coordinates; report them on the full frame
+            faces.append(Face(scale_boxes([box], 1.0 / scale)[0], match, person))
+
+        if self.scaler is not None:
+            face_heights = [(box[2] - box[0]) / scale for box, _ in results]
+            if self.scaler.update(time.perf_counter() - frame_start, face_heights):
+                if tracker is not None:
+                    tracker.rescale(self.scaler.scale / scale)
+                self.scale, self.upsample = self.scaler.scale, self.scaler.upsample
+
+        self.frames += 1
+        self.faces += len(faces)
+        self.seconds += time.perf_counter() - frame_start
+        return faces
+
+    def mark(self, person):
+        """Appends an attendance row for the student to the sink."""
+        self.sink.append(attendance_row(person))
+        self.marked_nis.add(person["nis"])
+        self.marks += 1
+        print(f"Attendance marked for {person['name']} ({person['nis']})")
+
+    @staticmethod
+    def draw(frame, faces):
+        """Draws the box and name of each face onto the frame."""
+        for face in faces:
+            top, right, bottom, left = face.box
+            label = "Unknown "
+            if face.person is not None:
+                label = f"{face.person['name']} {1 - face.match.distance:.0%}"
+            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+            cv2.putText(
+                frame,
+                label,
+                (left, top - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.7,
+                (0, 255, 0),
+                2,
+            )
+
+    def draw_metrics(self, frame):
+        """Draws the rolling FPS and the time of each stage in the corner."""
+        lines = [f"{self.metrics.fps():.1f} FPS"]
+        lines += [f"{stage} {ms:.1f} ms" for stage, ms in self.metrics.recent_ms()]
+        for i, line in enumerate(lines):
+            position = (10, 25 + 20 * i)
+            # A dark outline keeps the text readable on any background
+            cv2.putText(
+                frame, line, position, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 3
+            )
+            cv2.putText(
+                frame,
+                line,
+                position,
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (255, 255, 255),
+                1,
+            )
+
+    def write_metrics(self, force=False):
+        """Writes the metrics file every `metrics_interval` seconds."""
+        if not self.metrics_file:
+            return
+        now = time.monotonic()
+        if not force and now - self._metrics_written < self.metrics_interval:
+            return
+        self._metrics_written = now
+        counters = {"frames": self.frames, "faces": self.faces, "marks": self.marks}
+        if self.source is not None and hasattr(self.source, "stats"):
+            counters["frames_dropped"] = self.source.stats()["dropped"]
+        try:
+            self.metrics.write(self.metrics_file, counters)
+        except OSError as e:
+            print(f"Could not write {self.metrics_file}: {e}")
+
+    def run(self, source, on_frame=None, max_frames=None):
+        """
+        Processes frames from `source` (see capture.open_source) until it runs
+        out, `max_frames` have been processed or on_frame(frame, faces) returns
+        False. The source is released at the end.
+        """
+        self.source = source
+        source.start()
+        start = time.perf_counter()
+        try:
+            while max_frames is None or self.frames < max_frames:
+                if self.profiler.busy:
+                    self.profiler.tick()
+                t = time.perf_counter()
+                ret, frame = source.read()
+                if not ret:
+                    break
+                self.metrics.lap("capture", t)
+                faces = self.process(frame)
+                if on_frame is not None and on_frame(frame, faces) is False:
+                    break
+                self.metrics.frame_done()
+                self.write_metrics()
+        finally:
+            self.profiler.stop()
+            self.elapsed += time.perf_counter() - start
+            source.release()
+            self.write_metrics(force=True)
+
+    def close(self):
+        self.encoder.close()
+
+    def stats(self):
+        """Returns the engine counters as a dict."""
+        elapsed = self.elapsed or self.seconds
+        return {
+            "frames": self.frames,
+            "faces": self.faces,
+            "marks": self.marks,
+            "seconds": elapsed,
+            "fps": self.frames / elapsed if elapsed else 0.0,
+            "ms_per_frame": 1000 * self.seconds / self.frames if self.frames else 0.0,
+        }
+
+    def report(self):
+        """Returns a summary of the session, one line per pipeline component."""
+        stats = self.stats()
+        lines = [
+            f"Recognition: {stats['frames']} frames in {stats['seconds']:.1f}s "
+            f"({stats['fps']:.1f} frames/s, {stats['ms_per_frame']:.0f} ms "
+            f"processing each), {stats['faces']} faces, {stats['marks']} marked",
+            f"Stages: {self.metrics.summary()}",
+        ]
+        if self.source is not None and hasattr(self.source, "stats"):
+            stats = self.source.stats()
+            lines.append(
+                f"Capture: {stats['captured']} frames, {stats['decoded']} "
+                f"decoded, {stats['delivered']} processed, {stats['dropped']} "
+                f"stale frames dropped ({stats['drop_ratio']:.0%})"
+            )
+        if self.tracker is not None:
+            stats = self.tracker.stats()
+            lines.append(
+                f"Tracking: {stats['detections']} detections, "
+                f"{stats['tracks_created']} tracks, {stats['encodes']} encodes, "
+                f"{stats['resets']} identities reset"
+            )
+        if isinstance(self.matcher, RosterMatcher):
+            stats = self.matcher.stats()
+            lines.append(
+                f"Roster: {stats['roster_hits']} faces matched within the "
+                f"session roster, {stats['fallbacks']} searched in the full gallery"
+            )
+        if self.scaler is not None:
+            stats = self.scaler.stats()
+            lines.append(
+                f"Adaptive scale: settled on scale {stats['scale']} with upsample "
+                f"{stats['upsample']} ({stats['latency_ms']:.0f} ms per frame, "
+                f"{stats['adjustments']} adjustments)"
+            )
+        if self.gate is not None:
+            stats = self.gate.stats()
+            lines.append(
+                f"Motion gate: skipped detection on {stats['skipped']} of "
+                f"{stats['frames']} frames ({stats['skip_ratio']:.0%})"
+            )
+        return "\n".join(lines)
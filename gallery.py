@@ -0,0 +1,392 @@
+"""
+On-disk gallery of registered faces.
+
+The gallery is a snapshot plus a write-ahead log:
+
+- gallery-<gen>.npy: float32 encodings matrix, opened with mmap on load
+- gallery-<gen>.jsonl: person data, one JSON object per line
+- gallery-<gen>.wal: changes (add, update, remove) made since the snapshot
+- gallery.current: the generation number <gen> in use
+
+A registration only appends one checksummed record to the log, so it costs
+the same however large the gallery is. Loading maps the snapshot and replays
+the log. A torn write at the end of the log loses at most that last record.
+Once the log grows past `compact_bytes`, a background thread folds it into a
+new snapshot generation and switches gallery.current over atomically.
+"""
+
+import base64
+import glob
+import io
+import itertools
+import json
+import os
+import pickle
+import re
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+DTYPE = np.float32
+# Each log record is: payload length, CRC32 of the payload, JSON payload
+RECORD_HEADER = struct.Struct("<II")
+
+
+def _npy_header(rows, dim):
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header,
+        {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(DTYPE)),
+            "fortran_order": False,
+            "shape": (rows, dim),
+        },
+    )
+    return header.getvalue()
+
+
+def read_pickled_encodings(path):
+    """
+    Reads face encodings and person data from the old pickle file.
+    This version also sanitizes the data to remove corrupted/invalid entries,
+    fixing the root cause of the "string indices must be integers" error.
+    """
+    # Always start with fresh lists
+    clean_encodings = []
+    clean_person_data = []
+
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                # Load the potentially corrupted data from the file
+                loaded_encodings, loaded_person_data = pickle.load(f)
+
+            # Iterate through the loaded data and keep only the valid pairs
+            for i, person in enumerate(loaded_person_data):
+                # We only keep the item if it's a dictionary
+                if isinstance(person, dict):
+                    # And if its corresponding encoding exists
+                    if i < len(loaded_encodings):
+                        clean_person_data.append(person)
+                        clean_encodings.append(loaded_encodings[i])
+
+            # If we found and removed bad data, let the user know and save the clean file
+            if len(clean_person_data) != len(loaded_person_data):
+                print(f"Warning: Corrupted data was found and removed from {path}.")
+                # Overwrite the old file with the cleaned data
+                with open(path, "wb") as f:
+                    pickle.dump((clean_encodings, clean_person_data), f)
+
+        except Exception as e:
+            # This handles cases where the file is completely unreadable
+            print(f"Error reading {path}: {e}. A new file will be used.")
+            # The lists will remain empty, which is safe
+
+    return clean_encodings, clean_person_data
+
+
+def _fsync_write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class Gallery:
+    """The registered faces stored under `directory`."""
+
+    def __init__(self, directory, dim=128, compact_bytes=1 << 20):
+        self.directory = directory
+        self.dim = dim
+        self.compact_bytes = compact_bytes
+        self.current_path = os.path.join(directory, "gallery.current")
+        self.generation = None
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    def _path(self, generation, extension):
+        return os.path.join(self.directory, f"gallery-{generation:06d}.{extension}")
+
+    @property
+    def matrix_path(self):
+        return self._path(self.generation or 0, "npy")
+
+    @property
+    def wal_path(self):
+        return self._path(self.generation or 0, "wal")
+
+    def exists(self):
+        return os.path.exists(self.current_path)
+
+    # --- Snapshot ---
+    def _read_generation(self):
+        with open(self.current_path, "r") as f:
+            return int(f.read().strip())
+
+    def _read_snapshot(self, generation):
+        encodings = np.load(self._path(generation, "npy"), mmap_mode="r")
+        with open(self._path(generation, "jsonl"), "r", encoding="utf-8") as f:
+            # One json.loads() call for all lines is several times faster
+            people = json.loads("[" + ",".join(f.read().splitlines()) + "]")
+        if len(encodings) != len(people):
+            raise ValueError(f"Gallery snapshot {generation} is inconsistent")
+        return encodings, people
+
+    def _write_snapshot(self, generation, encodings, people, wal_bytes=b""):
+        """Writes a complete generation and makes it the current one."""
+        matrix = np.ascontiguousarray(
+            np.asarray(encodings, dtype=DTYPE).reshape(-1, self.dim)
+        )
+        _fsync_write(
+            self._path(generation, "npy"),
+            _npy_header(len(matrix), self.dim) + matrix.tobytes(),
+        )
+        lines = "".join(json.dumps(p, ensure_ascii=False) + "\n" for p in people)
+        _fsync_write(self._path(generation, "jsonl"), lines.encode("utf-8"))
+        _fsync_write(self._path(generation, "wal"), wal_bytes)
+
+        # The switch itself is a single atomic rename
+        tmp_path = self.current_path + ".tmp"
+        _fsync_write(tmp_path, f"{generation}\n".encode("ascii"))
+        os.replace(tmp_path, self.current_path)
+        self.generation = generation
+
+    def _remove_stale_generations(self):
+        """
+        Deletes the generations older than the one gallery.current points to.
+        Called with the lock held; newer generations are never touched, since
+        a compaction may be about to switch over to one.
+        """
+        current = self._read_generation()
+        for path in glob.glob(os.path.join(self.directory, "gallery-*.*")):
+            match = re.fullmatch(
+                r"gallery-(\d+)\.(npy|jsonl|wal)", os.path.basename(path)
+            )
+            if match and int(match.group(1)) < current:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # Still mapped (Windows); removed on a later load
+
+    def write(self, encodings, people):
+        """Replaces the whole gallery, e.g. when migrating older data."""
+        with self._lock:
+            generation = self.generation or 0
+            if os.path.exists(self.current_path):
+                generation = self._read_generation()
+            self._write_snapshot(generation + 1, encodings, people)
+            self._remove_stale_generations()
+
+    # --- Write-ahead log ---
+    def _append_record(self, record):
+        payload = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        data = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        if self.generation is None:
+            self.load()
+        with self._lock:
+            if self.generation is None:
+                # Very first registration: start with an empty snapshot
+                self._write_snapshot(1, np.empty((0, self.dim)), [])
+            with open(self.wal_path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+        if size >= self.compact_bytes:
+            self.compact_in_background()
+
+    def _read_records(self, path, end=None):
+        """Returns (records, valid_end) for the intact records of a log."""
+        if not os.path.exists(path):
+            return [], 0
+        with open(path, "rb") as f:
+            data = f.read() if end is None else f.read(end)
+        records, offset = [], 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, checksum = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            payload = data[start : start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            records.append(json.loads(payload.decode("utf-8")))
+            offset = start + length
+        return records, offset
+
+    def _encode_vector(self, encoding):
+        vector = np.asarray(encoding, dtype=DTYPE).reshape(self.dim)
+        return base64.b64encode(vector.tobytes()).decode("ascii")
+
+    def _decode_vector(self, text):
+        return np.frombuffer(base64.b64decode(text), dtype=DTYPE)
+
+    def add(self, encoding, person):
+        """Records a newly registered face."""
+        self._append_record(
+            {"op": "add", "person": person, "encoding": self._encode_vector(encoding)}
+        )
+
+    def update(self, nis, person=None, encoding=None):
+        """Changes the details and/or the face of the student with this NIS."""
+        record = {"op": "update", "nis": nis}
+        if person is not None:
+            record["person"] = person
+        if encoding is not None:
+            record["encoding"] = self._encode_vector(encoding)
+        self._append_record(record)
+
+    def remove(self, nis):
+        """Removes every registered face of the student with this NIS."""
+        self._append_record({"op": "remove", "nis": nis})
+
+    def _replay(self, encodings, people, records):
+        """Applies log records on top of a snapshot."""
+        if not records:
+            return encodings, people  # Keep the memory map as it is
+
+        # Rows keep their position until the end: removing one only clears
+        # its flag, and `source` says where each row's vector comes from (a
+        # snapshot row below `n`, otherwise n + its index in `vectors`)
+        n = len(people)
+        total = n + sum(record["op"] == "add" for record in records)
+        source = np.arange(total)
+        alive = np.zeros(total, dtype=bool)
+        alive[:n] = True
+        people = list(people)
+        vectors = []
+
+        # Only the students named by an update or remove are looked up, so
+        # the snapshot is scanned once whatever the number of records
+        targets = set()
+        for record in records:
+            if record["op"] != "add":
+                targets.add(record["nis"])
+                targets.add(record.get("person", {}).get("nis"))
+        targets.discard(None)
+        rows_by_nis = {}
+        if targets:
+            for row, nis in enumerate([person.get("nis") for person in people]):
+                if nis in targets:
+                    rows_by_nis.setdefault(nis, []).append(row)
+
+        for record in records:
+            op = record["op"]
+            if op == "add":
+                row = len(people)
+                source[row] = n + len(vectors)
+                alive[row] = True
+                vectors.append(self._decode_vector(record["encoding"]))
+                people.append(record["person"])
+                if record["person"].get("nis") in targets:
+                    rows_by_nis.setdefault(record["person"]["nis"], []).append(row)
+            elif op == "remove":
+                alive[rows_by_nis.pop(record["nis"], [])] = False
+            elif op == "update":
+                rows = rows_by_nis.get(record["nis"], [])
+                if "encoding" in record and rows:
+                    source[rows] = n + len(vectors)
+                    vectors.append(self._decode_vector(record["encoding"]))
+                if "person" in record:
+                    for row in rows:
+                        people[row] = {**people[row], **record["person"]}
+                    nis = record["person"].get("nis", record["nis"])
+                    if nis != record["nis"] and rows:
+                        rows_by_nis[nis] = rows_by_nis.get(nis, []) + rows_by_nis.pop(
+                            record["nis"]
+                        )
+
+        keep = np.flatnonzero(alive)
+        rows = source[keep]
+        from_snapshot = rows < n
+        matrix = np.empty((len(keep), self.dim), dtype=DTYPE)
+        matrix[from_snapshot] = np.take(encodings, rows[from_snapshot], axis=0)
+        if vectors:
+            matrix[~from_snapshot] = np.take(
+                np.stack(vectors), rows[~from_snapshot] - n, axis=0
+            )
+        if len(keep) != len(people):
+            people = list(itertools.compress(people, alive.tolist()))
+        return matrix, people
+
+    # --- Loading and compaction ---
+    def load(self):
+        """
+        Returns (encodings, person_data) for the current gallery: the
+        memory-mapped snapshot with the write-ahead log replayed on top.
+        """
+        # Held throughout, so a compaction cannot switch generations between
+        # reading gallery.current and reading the snapshot and log it names
+        with self._lock:
+            if not os.path.exists(self.current_path):
+                return np.empty((0, self.dim), dtype=DTYPE), []
+
+            self.generation = self._read_generation()
+            encodings, people = self._read_snapshot(self.generation)
+            records, valid_end = self._read_records(self.wal_path)
+            if (
+                os.path.exists(self.wal_path)
+                and os.path.getsize(self.wal_path) != valid_end
+            ):
+                # Drop the torn tail so new records are not appended after it
+                print(f"Warning: Discarded an incomplete record in {self.wal_path}.")
+                with open(self.wal_path, "r+b") as f:
+                    f.truncate(valid_end)
+            self._remove_stale_generations()
+        return self._replay(encodings, people, records)
+
+    def migrate_pickle(self, path):
+        """
+        Copies the faces of an old encodings.pkl into the gallery, unless the
+        gallery already exists. The pickle is left in place as a backup.
+        """
+        if self.exists() or not os.path.exists(path):
+            return
+        encodings, person_data = read_pickled_encodings(path)
+        if person_data:
+            self.write(encodings, person_data)
+            print(
+                f"Migrated {len(person_data)} registered faces from "
+                f"{path} to {self.matrix_path}."
+            )
+
+    def compact(self):
+        """Folds the write-ahead log into a new snapshot generation."""
+        with self._lock:
+            generation = self.generation
+            if generation is None or not os.path.exists(self.wal_path):
+                return
+            wal_end = os.path.getsize(self.wal_path)
+        if not wal_end:
+            return
+
+        encodings, people = self._read_snapshot(generation)
+        records, valid_end = self._read_records(self._path(generation, "wal"), wal_end)
+        encodings, people = self._replay(encodings, people, records)
+
+        with self._lock:
+            if self.generation != generation:
+                return  # The gallery was replaced meanwhile
+            # Registrations made while we worked move over to the new log
+            with open(self._path(generation, "wal"), "rb") as f:
+                f.seek(valid_end)
+                tail = f.read()
+            self._write_snapshot(generation + 1, encodings, people, tail)
+            del encodings
+            self._remove_stale_generations()
+
+    def compact_in_background(self):
+        """Starts compact() on a background thread unless one is running."""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(
+            target=self._compact_safely, name="GalleryCompactor", daemon=True
+        )
+        self._compactor.start()
+
+    def _compact_safely(self):
+        try:
+            self.compact()
+        except Exception as e:
+            # The log is still intact; the next large write retries
+            print(f"Gallery compaction failed: {e}")
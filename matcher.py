@@ -0,0 +1,301 @@
+"""Vectorized matching of face encodings against the registered gallery."""
+
+from collections import namedtuple
+
+import numpy as np
+
+# Result for one face: gallery index of the closest person (None when the
+# gallery is empty), its euclidean distance and whether it is within tolerance.
+Match = namedtuple("Match", ["index", "distance", "is_match"])
+
+
+class FaceMatcher:
+    """
+    Holds the known encodings as one contiguous float matrix with precomputed
+    squared norms, so every face in a frame is matched with a single
+    distance-matrix operation instead of scanning the gallery twice per face.
+
+    A float32 (n, dim) array, such as the memory-mapped gallery snapshot, is
+    used as it is rather than copied, and its norms are only computed on the
+    first match. Loading the gallery then costs the same at any size; the
+    matrix is copied only when faces are added to it.
+    """
+
+    def __init__(self, encodings=(), dim=128):
+        self.dim = dim
+        self._size = 0
+        self._matrix = np.empty((0, dim), dtype=np.float64)
+        self._sq_norms = np.empty(0, dtype=np.float64)
+        if (
+            isinstance(encodings, np.ndarray)
+            and encodings.dtype == np.float32
+            and encodings.ndim == 2
+            and encodings.shape[1] == dim
+        ):
+            self._matrix = encodings
+            self._size = len(encodings)
+            self._sq_norms = None
+        elif len(encodings):
+            self.add_many(encodings)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        """The gallery as a (n, dim) view; rows line up with known_person_data."""
+        return self._matrix[: self._size]
+
+    def _norms(self):
+        """The squared norms of the gallery rows, computed on first use."""
+        if self._sq_norms is None:
+            self._sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        return self._sq_norms
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        if needed <= len(self._matrix):
+            return
+        # Grow geometrically so repeated registrations stay amortized O(1)
+        capacity = max(needed, 2 * len(self._matrix), 64)
+        matrix = np.empty((capacity, self.dim), dtype=self._matrix.dtype)
+        sq_norms = np.empty(capacity, dtype=self._matrix.dtype)
+        matrix[: self._size] = self._matrix[: self._size]
+        sq_norms[: self._size] = self._norms()[: self._size]
+        self._matrix, self._sq_norms = matrix, sq_norms
+
+    def add_many(self, encodings):
+        """Appends a batch of encodings to the gallery."""
+        block = np.asarray(encodings, dtype=self._matrix.dtype).reshape(-1, self.dim)
+        if not len(block):
+            return
+        self._reserve(len(block))
+        end = self._size + len(block)
+        self._matrix[self._size : end] = block
+        self._sq_norms[self._size : end] = np.einsum("ij,ij->i", block, block)
+        self._size = end
+
+    def add(self, encoding):
+        """Appends a single encoding, e.g. right after a registration."""
+        self.add_many([encoding])
+
+    def distances(self, face_encodings):
+        """Returns the (faces, gallery) euclidean distance matrix."""
+        # Queries take the gallery's dtype, so a float32 gallery is never
+        # converted to float64 on every call
+        queries = np.asarray(face_encodings, dtype=self._matrix.dtype).reshape(
+            -1, self.dim
+        )
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        # |q - g|^2 = |q|^2 + |g|^2 - 2 q.g, computed for all pairs at once
+        sq = q_norms[:, None] + self._norms()[None, : self._size]
+        sq -= 2.0 * (queries @ self.matrix.T)
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def match(self, face_encodings, tolerance=0.6):
+        """Returns one Match per face encoding, in the same order."""
+        if len(face_encodings) == 0:
+            return []
+        if self._size == 0:
+            return [Match(None, float("inf"), False) for _ in face_encodings]
+
+        dist = self.distances(face_encodings)
+        best = np.argmin(dist, axis=1)
+        best_dist = dist[np.arange(len(best)), best]
+        return [
+            Match(int(i), float(d), bool(d <= tolerance))
+            for i, d in zip(best, best_dist)
+        ]
+
+
+class IVFIndex(FaceMatcher):
+    """
+    Approximate nearest-neighbour search for large galleries (IVF).
+
+    The encodings are clustered with k-means into `nlist` buckets. A face is
+    compared only with the people in the `nprobe` buckets whose centroids are
+    closest to it, instead of the whole gallery. When nothing within tolerance
+    is found there, the exact brute-force search is used as a fallback, so a
+    registered student is never missed because of a bad bucket choice.
+
+    Below `min_train_size` entries the index simply behaves like FaceMatcher.
+    New encodings are assigned to the nearest bucket as they are added, and
+    the buckets are retrained once the gallery has doubled in size.
+    """
+
+    def __init__(
+        self,
+        encodings=(),
+        dim=128,
+        nlist=None,
+        nprobe=4,
+        min_train_size=2000,
+        exact_fallback=True,
+        seed=0,
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.exact_fallback = exact_fallback
+        self._rng = np.random.default_rng(seed)
+        self.centroids = None
+        self._lists = []
+        self._list_arrays = []
+        self._trained_size = 0
+        super().__init__(encodings, dim)
+        if not self.trained and self._size >= self.min_train_size:
+            self.train()  # A wrapped gallery does not go through add_many()
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def add_many(self, encodings):
+        start = self._size
+        super().add_many(encodings)
+        if not self.trained:
+            if self._size >= self.min_train_size:
+                self.train()
+        elif self._size >= 2 * self._trained_size:
+            self.train()
+        else:
+            self._assign(np.arange(start, self._size))
+
+    def train(self, iterations=10):
+        """Clusters the current gallery into buckets with k-means."""
+        data = self.matrix
+        nlist = self.nlist or max(1, int(np.sqrt(len(data))))
+        nlist = min(nlist, len(data))
+        # Training on a sample is plenty for bucket centroids
+        sample_size = min(len(data), 64 * nlist)
+        sample = data[self._rng.choice(len(data), sample_size, replace=False)]
+        centroids = sample[self._rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            nearest = self._nearest_centroid(sample, centroids)
+            for c in range(nlist):
+                members = sample[nearest == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+
+        self.centroids = centroids
+        self._lists = [[] for _ in range(nlist)]
+        self._list_arrays = [None] * nlist
+        self._trained_size = self._size
+        self._assign(np.arange(self._size))
+
+    @staticmethod
+    def _nearest_centroid(vectors, centroids, k=1):
+        sq = (
+            np.einsum("ij,ij->i", vectors, vectors)[:, None]
+            + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+            - 2.0 * (vectors @ centroids.T)
+        )
+        if k == 1:
+            return np.argmin(sq, axis=1)
+        k = min(k, sq.shape[1])
+        return np.argpartition(sq, k - 1, axis=1)[:, :k]
+
+    def _assign(self, ids):
+        if not len(ids):
+            return
+        for i, c in zip(ids, self._nearest_centroid(self._matrix[ids], self.centroids)):
+            self._lists[c].append(int(i))
+            self._list_arrays[c] = None
+
+    def _bucket(self, c):
+        if self._list_arrays[c] is None:
+            self._list_arrays[c] = np.asarray(self._lists[c], dtype=np.intp)
+        return self._list_arrays[c]
+
+    def match(self, face_encodings, tolerance=0.6):
+        if not self.trained or len(face_encodings) == 0:
+            return super().match(face_encodings, tolerance)
+
+        queries = np.asarray(face_encodings, dtype=self._matrix.dtype).reshape(
+            -1, self.dim
+        )
+        probes = self._nearest_centroid(queries, self.centroids, k=self.nprobe)
+        results = []
+        for query, buckets in zip(queries, probes.reshape(len(queries), -1)):
+            candidates = np.concatenate([self._bucket(c) for c in buckets])
+            match = Match(None, float("inf"), False)
+            if len(candidates):
+                sq = (
+                    query @ query
+                    + self._norms()[candidates]
+                    - 2.0 * (self._matrix[candidates] @ query)
+                )
+                best = int(np.argmin(sq))
+                distance = float(np.sqrt(max(sq[best], 0.0)))
+                match = Match(int(candidates[best]), distance, distance <= tolerance)
+            if not match.is_match and self.exact_fallback:
+                match = super().match([query], tolerance)[0]
+            results.append(match)
+        return results
+
+
+def make_matcher(kind="brute", encodings=(), **options):
+    """Returns the gallery index selected in settings ("brute" or "ivf")."""
+    if kind == "ivf":
+        return IVFIndex(encodings, **options)
+    if kind != "brute":
+        print(f"Warning: Unknown match index '{kind}', using brute force.")
+    return FaceMatcher(encodings)
+
+
+def compare_with_exact(index, face_encodings, tolerance=0.6):
+    """
+    Measures an index against exact brute-force search on the same gallery.
+    Returns recall (share of faces whose exact best match was also found) and
+    the average per-face latency of both, in milliseconds.
+    """
+    import time
+
+    exact = FaceMatcher(index.matrix)
+    # One face per call, as in a frame with a single student in view
+    start = time.perf_counter()
+    approx_results = [index.match([face], tolerance)[0] for face in face_encodings]
+    approx_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    exact_results = [exact.match([face], tolerance)[0] for face in face_encodings]
+    exact_seconds = time.perf_counter() - start
+
+    hits = sum(a.index == e.index for a, e in zip(approx_results, exact_results))
+    count = max(len(face_encodings), 1)
+    return {
+        "faces": len(face_encodings),
+        "gallery": len(index),
+        "recall": hits / count,
+        "index_ms_per_face": 1000 * approx_seconds / count,
+        "exact_ms_per_face": 1000 * exact_seconds / count,
+    }
+
+
+if __name__ == "__main__":
+    # Recall/latency report of the IVF index on a synthetic gallery, e.g.
+    #   python matcher.py --gallery 20000 --nprobe 4
+    import argparse
+
+    parser = argparse.ArgumentParser(description=compare_with_exact.__doc__)
+    parser.add_argument("--gallery", type=int, default=20000)
+    parser.add_argument("--faces", type=int, default=500)
+    parser.add_argument("--nprobe", type=int, default=4)
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    # Spread like real encodings: identities ~0.8 apart, same person ~0.35
+    gallery = rng.normal(0.0, 0.8 / np.sqrt(256), (args.gallery, 128))
+    picks = rng.choice(args.gallery, args.faces)
+    faces = gallery[picks] + rng.normal(0.0, 0.35 / np.sqrt(128), (args.faces, 128))
+
+    index = IVFIndex(gallery, nprobe=args.nprobe, exact_fallback=False)
+    report = compare_with_exact(index, faces, args.tolerance)
+    for key, value in report.items():
+        print(
+            f"{key:>18}: {value:.4g}"
+            if isinstance(value, float)
+            else f"{key:>18}: {value}"
+        )
@@ -0,0 +1,114 @@
+"""Per-stage timing of the recognition loop, rolling FPS and a metrics file."""
+
+import os
+import time
+from collections import deque
+
+PREFIX = "attendance"
+
+
+class PipelineMetrics:
+    """
+    Accumulates the time spent in each stage of the recognition loop. Timing a
+    stage costs two perf_counter() calls and a dict update:
+
+        t = time.perf_counter()
+        small_frame = cv2.resize(...)
+        t = metrics.lap("resize", t)
+
+    Totals never reset and are exported as Prometheus counters. The last
+    `window` frames also feed the rolling FPS and per-stage averages shown in
+    the overlay.
+
+    Stages may be timed from more than one thread (the display times its own
+    stage); readers take a copy of the dicts before iterating.
+    """
+
+    def __init__(self, window=30):
+        self.totals = {}
+        self.calls = {}
+        self._recent = {}
+        self._window = window
+        self._frame_ends = deque(maxlen=window + 1)
+
+    def add(self, stage, seconds):
+        """Records one run of a stage."""
+        if stage not in self.totals:
+            self.totals[stage] = 0.0
+            self.calls[stage] = 0
+            self._recent[stage] = deque(maxlen=self._window)
+        self.totals[stage] += seconds
+        self.calls[stage] += 1
+        self._recent[stage].append(seconds)
+
+    def lap(self, stage, since):
+        """Records the time from `since` to now for `stage`; returns now."""
+        now = time.perf_counter()
+        self.add(stage, now - since)
+        return now
+
+    def frame_done(self, now=None):
+        """Marks the end of one loop iteration, for the rolling FPS."""
+        self._frame_ends.append(time.perf_counter() if now is None else now)
+
+    def fps(self):
+        """Loop iterations per second over the last `window` frames."""
+        if len(self._frame_ends) < 2:
+            return 0.0
+        span = self._frame_ends[-1] - self._frame_ends[0]
+        return (len(self._frame_ends) - 1) / span if span > 0 else 0.0
+
+    def recent_ms(self):
+        """Returns [(stage, average ms)] over the last `window` runs of each."""
+        return [
+            (stage, 1000 * sum(recent) / len(recent))
+            for stage, recent in list(self._recent.items())
+            if recent
+        ]
+
+    def summary(self):
+        """Returns the average ms per call of every stage as one line."""
+        return ", ".join(
+            f"{stage} {1000 * total / self.calls[stage]:.1f} ms"
+            for stage, total in list(self.totals.items())
+        )
+
+    def prometheus_text(self, counters=None):
+        """
+        Returns the metrics in the Prometheus text format. `counters` adds
+        plain totals, e.g. {"frames": 1200} becomes attendance_frames_total.
+        """
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds_total Time spent in each pipeline stage.",
+            f"# TYPE {PREFIX}_stage_seconds_total counter",
+        ]
+        for stage, total in list(self.totals.items()):
+            lines.append(f'{PREFIX}_stage_seconds_total{{stage="{stage}"}} {total:.6f}')
+        lines += [
+            f"# HELP {PREFIX}_stage_calls_total Runs of each pipeline stage.",
+            f"# TYPE {PREFIX}_stage_calls_total counter",
+        ]
+        for stage, calls in list(self.calls.items()):
+            lines.append(f'{PREFIX}_stage_calls_total{{stage="{stage}"}} {calls}')
+        for name, value in (counters or {}).items():
+            lines += [
+                f"# TYPE {PREFIX}_{name}_total counter",
+                f"{PREFIX}_{name}_total {value}",
+            ]
+        lines += [
+            f"# HELP {PREFIX}_fps Loop iterations per second, rolling.",
+            f"# TYPE {PREFIX}_fps gauge",
+            f"{PREFIX}_fps {self.fps():.2f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, counters=None):
+        """
+        Writes prometheus_text() to `path`, e.g. for node_exporter's textfile
+        collector. The file is replaced atomically, so it is never read half
+        written.
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text(counters))
+        os.replace(tmp_path, path)
@@ -0,0 +1,69 @@
+"""On-demand cProfile of the recognition loop, for stations that turn sluggish."""
+
+import cProfile
+import datetime
+import os
+import time
+
+
+class LoopProfiler:
+    """
+    Profiles the next few seconds of the recognition loop when asked to.
+
+    request() may be called from any thread (e.g. a hotkey); the loop thread
+    itself starts and stops cProfile in tick(), since cProfile only sees the
+    thread that enabled it. While nothing is requested the loop only checks
+    the `busy` attribute, so there is no overhead when profiling is off.
+
+    The result is written as data/profile-<date>-<time>.pstats, which can be
+    opened with `python -m pstats` or flame-graph viewers such as snakeviz.
+    """
+
+    def __init__(self, directory="data", seconds=10):
+        self.directory = directory
+        self.seconds = seconds
+        self.busy = False
+        self._requested = None
+        self._profile = None
+        self._until = 0.0
+
+    @property
+    def active(self):
+        return self._profile is not None
+
+    def request(self, seconds=None):
+        """Asks for the next `seconds` of the loop to be profiled."""
+        if self.busy:
+            return
+        self._requested = seconds or self.seconds
+        self.busy = True
+
+    def tick(self):
+        """Called by the loop once per frame while `busy` is set."""
+        if self._profile is None:
+            seconds, self._requested = self._requested, None
+            self._until = time.monotonic() + seconds
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            print(f"Profiling the recognition loop for {seconds:g}s...")
+        elif time.monotonic() >= self._until:
+            self.stop()
+
+    def stop(self):
+        """Stops a running profile and writes it; returns the file path."""
+        if self._profile is None:
+            self.busy = False
+            return None
+        self._profile.disable()
+        name = datetime.datetime.now().strftime("profile-%Y%m%d-%H%M%S.pstats")
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._profile.dump_stats(path)
+            print(f"Profile written to {path}")
+        except OSError as e:
+            print(f"Could not write the profile to {path}: {e}")
+            path = None
+        self._profile = None
+        self.busy = False
+        return path
@@ -0,0 +1,95 @@
+"""Matching restricted to the classes expected at the current prayer session."""
+
+import datetime
+
+import numpy as np
+
+from matcher import FaceMatcher, Match
+
+
+def _normalize_class(name):
+    return str(name).strip().casefold()
+
+
+def active_classes(schedule, now=None):
+    """
+    Returns the set of classes expected at `now`, or None when no session of
+    the schedule is running. The schedule is a list of entries like
+    {"start": "11:45", "end": "12:30", "classes": ["X-1", "X-2"]}.
+    """
+    now = now or datetime.datetime.now()
+    current = now.strftime("%H:%M")
+    for session in schedule:
+        if session["start"] <= current < session["end"]:
+            return frozenset(_normalize_class(c) for c in session["classes"])
+    return None
+
+
+class RosterMatcher:
+    """
+    Searches the students of the classes expected right now first, and only
+    falls back to the full gallery index for faces without a match there.
+    Fewer candidates means faster matching and fewer false matches against
+    students who are not supposed to be at this session.
+    """
+
+    def __init__(self, index, person_data, schedule, clock=datetime.datetime.now):
+        self.index = index
+        self.person_data = person_data
+        self.schedule = schedule
+        self.clock = clock
+        self._classes = None
+        self._ids = np.empty(0, dtype=np.intp)
+        self._roster = FaceMatcher()
+
+        self.roster_hits = 0
+        self.fallbacks = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def _refresh(self):
+        classes = active_classes(self.schedule, self.clock())
+        if classes == self._classes:
+            return
+        self._classes = classes
+        ids = []
+        if classes:
+            ids = [
+                i
+                for i, person in enumerate(self.person_data[: len(self.index)])
+                if _normalize_class(person.get("class", "")) in classes
+            ]
+        self._ids = np.asarray(ids, dtype=np.intp)
+        self._roster = FaceMatcher(self.index.matrix[self._ids])
+        if classes:
+            print(
+                f"Session roster: {len(ids)} of {len(self.index)} students "
+                f"in {', '.join(sorted(classes))}"
+            )
+
+    def match(self, face_encodings, tolerance=0.6):
+        self._refresh()
+        if not len(self._roster):
+            return self.index.match(face_encodings, tolerance)
+
+        results = []
+        missing = []
+        for i, match in enumerate(self._roster.match(face_encodings, tolerance)):
+            if match.is_match:
+                self.roster_hits += 1
+                results.append(Match(int(self._ids[match.index]), match.distance, True))
+            else:
+                missing.append(i)
+                results.append(None)
+
+        if missing:
+            self.fallbacks += len(missing)
+            full = self.index.match([face_encodings[i] for i in missing], tolerance)
+            for i, match in zip(missing, full):
+                results[i] = match
+        return results
+
+    def stats(self):
+        """Returns how many faces were resolved by the roster vs. the fallback."""
+        return {"roster_hits": self.roster_hits, "fallbacks": self.fallbacks}
@@ -0,0 +1,89 @@
+"""
+Station settings for the recognition pipeline.
+
+The defaults live in DEFAULTS. Each station can override any of them in
+data/settings.json without touching the code.
+"""
+
+import json
+import os
+
+data_dir = "data"
+settings_file = os.path.join(data_dir, "settings.json")
+
+DEFAULTS = {
+    # Webcam capture mode; 0 or "" keeps the driver default. Run
+    # `python cli.py probe-camera` to see which modes the camera supports.
+    "camera_width": 0,
+    "camera_height": 0,
+    "camera_fps": 0,
+    "camera_fourcc": "",
+    "camera_buffer_size": 0,
+    # "grab" decodes only the frames recognition will process instead of
+    # every frame the camera sends ("read"); capture_fps caps that rate (0 = off)
+    "capture_mode": "read",
+    "capture_fps": 0,
+    # Worker processes used for face encoding (0 = encode on the main process)
+    "encoder_workers": 0,
+    # Detect every few frames and follow faces in between (see tracker.py)
+    "tracking": False,
+    "detect_every": 5,
+    # "iou" holds boxes between detections, "opencv" moves them with KCF/MIL
+    "tracker_backend": "iou",
+    # Identified faces are encoded again every few detections, in case another
+    # student stepped into the same spot (0 = never)
+    "reverify_every": 3,
+    # Encode from full-resolution crops instead of the downscaled frame
+    "encode_full_resolution": False,
+    # Retune detection scale and upsampling to hold target_fps
+    "adaptive_scale": False,
+    "target_fps": 10,
+    "scale_min": 0.2,
+    "scale_max": 0.5,
+    "upsample_min": 0,
+    "upsample_max": 2,
+    # Seconds between copying journaled marks into attendance.xlsx
+    "xlsx_flush_seconds": 60,
+    # Gallery search: "brute" (exact) or "ivf" (k-means buckets, large galleries)
+    "match_index": "brute",
+    "ivf_nprobe": 4,
+    # Prayer sessions and the classes expected at each, searched before the
+    # full gallery, e.g. [{"start": "11:45", "end": "12:30", "classes": ["X-1"]}]
+    "session_schedule": [],
+    # Skip detection on frames where nothing changed (see detection.MotionGate)
+    "motion_gate": False,
+    "motion_pixel_threshold": 25,
+    "motion_area_threshold": 0.01,
+    "motion_wake_seconds": 2.0,
+    # Frame rate cap of the recognition preview; 0 shows no preview at all
+    "display_fps": 15,
+    # Rolling FPS and per-stage times drawn on the recognition window
+    "metrics_overlay": False,
+    # Prometheus text file with the stage counters ("" = off), rewritten
+    # every metrics_interval seconds
+    "metrics_file": "",
+    "metrics_interval": 10,
+    # Seconds of the recognition loop profiled when 'p' is pressed
+    "profile_seconds": 10,
+}
+
+
+def load_settings(path=settings_file):
+    """Returns DEFAULTS updated with the overrides found in the settings file."""
+    settings = dict(DEFAULTS)
+    if not os.path.exists(path):
+        return settings
+
+    try:
+        with open(path, "r") as f:
+            overrides = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading {path}: {e}. Default settings will be used.")
+        return settings
+
+    for key, value in overrides.items():
+        if key not in DEFAULTS:
+            print(f"Warning: Unknown setting '{key}' in {path} was ignored.")
+            continue
+        settings[key] = value
+    return settings
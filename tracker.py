@@ -0,0 +1,236 @@
+"""Detect-once-then-track support, so each student is encoded once or twice."""
+
+import itertools
+
+import cv2
+
+from detection import scale_boxes
+from matcher import Match
+
+UNKNOWN = Match(None, float("inf"), False)
+
+
+def iou(box_a, box_b):
+    """Intersection-over-union of two (top, right, bottom, left) boxes."""
+    top = max(box_a[0], box_b[0])
+    right = min(box_a[1], box_b[1])
+    bottom = min(box_a[2], box_b[2])
+    left = max(box_a[3], box_b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    if inter == 0:
+        return 0.0
+    area_a = (box_a[1] - box_a[3]) * (box_a[2] - box_a[0])
+    area_b = (box_b[1] - box_b[3]) * (box_b[2] - box_b[0])
+    return inter / float(area_a + area_b - inter)
+
+
+def _create_opencv_tracker():
+    # KCF is much cheaper than MIL but only ships with opencv-contrib
+    for factory in ("TrackerKCF_create", "TrackerMIL_create"):
+        if hasattr(cv2, factory):
+            return getattr(cv2, factory)()
+        legacy = getattr(cv2, "legacy", None)
+        if legacy is not None and hasattr(legacy, factory):
+            return getattr(legacy, factory)()
+    return None
+
+
+class Track:
+    """One face followed across frames, with its resolved identity cached."""
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.match = UNKNOWN
+        self.missed = 0
+        self.cv_tracker = None
+        self.detections_since_check = 0
+        self.failed_checks = 0
+
+    @property
+    def identified(self):
+        return self.match.is_match
+
+    def forget(self):
+        """Drops the identity, so the face is encoded again."""
+        self.match = UNKNOWN
+        self.failed_checks = 0
+
+    def resolve(self, match):
+        """Stores the result of encoding and matching this track's face."""
+        if match.is_match or not self.identified:
+            self.match = match
+            self.failed_checks = 0
+            self.detections_since_check = 0
+            return
+        # Never downgrade a confident identity because of one blurry frame,
+        # but two failed re-checks in a row mean someone else is standing here.
+        # The track stays due, so it is checked again at the next detection.
+        self.failed_checks += 1
+        if self.failed_checks >= 2:
+            self.match = match
+            self.failed_checks = 0
+
+
+class FaceTracker:
+    """
+    Runs full detection only every `detect_every` frames and follows faces in
+    between. Detections are associated to existing tracks by IoU; a track keeps
+    its identity, so only new tracks (and those still unknown) are encoded.
+
+    In a queue the next student often steps into the spot the previous one
+    just left, so overlap alone cannot tell them apart. A track forgets its
+    identity when its box jumps in size or position between detections, and
+    identified tracks are encoded again every `reverify_every` detections
+    (0 = never).
+
+    With backend "iou" boxes are held in place between detections, which is
+    free and fine for students standing in line. Backend "opencv" moves them
+    with an OpenCV KCF/MIL tracker on every frame instead.
+    """
+
+    def __init__(
+        self,
+        detect_every=5,
+        iou_threshold=0.3,
+        max_missed=2,
+        backend="iou",
+        reverify_every=3,
+        max_size_change=1.5,
+        max_shift=0.4,
+    ):
+        self.detect_every = max(1, int(detect_every))
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.backend = backend
+        self.reverify_every = reverify_every
+        # Height ratio, and center shift relative to the face height
+        self.max_size_change = max_size_change
+        self.max_shift = max_shift
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self._frames_since_detection = self.detect_every
+
+        # Counters for the end-of-session report
+        self.detections = 0
+        self.tracks_created = 0
+        self.encodes = 0
+        self.resets = 0
+
+    def due_for_detection(self):
+        """True when the next frame should run full face detection."""
+        return self._frames_since_detection >= self.detect_every
+
+    def _jumped(self, old_box, new_box):
+        """True when a box changed too much to still be the same face."""
+        old_height = max(1, old_box[2] - old_box[0])
+        new_height = max(1, new_box[2] - new_box[0])
+        if max(old_height, new_height) / min(old_height, new_height) > (
+            self.max_size_change
+        ):
+            return True
+        dy = (new_box[0] + new_box[2] - old_box[0] - old_box[2]) / 2
+        dx = (new_box[1] + new_box[3] - old_box[1] - old_box[3]) / 2
+        return (dx * dx + dy * dy) ** 0.5 > self.max_shift * old_height
+
+    def update(self, rgb_frame, face_locations):
+        """
+        Associates a fresh set of detections with the current tracks and
+        returns the tracks whose face needs to be encoded.
+        """
+        self.detections += 1
+        self._frames_since_detection = 1
+
+        # Greedy association, best overlapping pairs first
+        pairs = sorted(
+            (
+                (iou(track.box, box), t, d)
+                for t, track in enumerate(self.tracks)
+                for d, box in enumerate(face_locations)
+            ),
+            reverse=True,
+        )
+        matched_tracks, matched_boxes = set(), set()
+        for overlap, t, d in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(d)
+            track = self.tracks[t]
+            if track.identified and self._jumped(track.box, face_locations[d]):
+                track.forget()
+                self.resets += 1
+            track.box = face_locations[d]
+            track.missed = 0
+            track.detections_since_check += 1
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    continue  # Lost: a returning face starts a new track
+            survivors.append(track)
+        self.tracks = survivors
+
+        for d, box in enumerate(face_locations):
+            if d not in matched_boxes:
+                self.tracks.append(Track(next(self._ids), box))
+                self.tracks_created += 1
+
+        if self.backend == "opencv":
+            for track in self.tracks:
+                self._init_cv_tracker(track, rgb_frame)
+
+        pending = [
+            track
+            for track in self.tracks
+            if track.missed == 0
+            and (not track.identified or self._due_for_check(track))
+        ]
+        self.encodes += len(pending)
+        return pending
+
+    def _due_for_check(self, track):
+        return (
+            self.reverify_every > 0
+            and track.detections_since_check >= self.reverify_every
+        )
+
+    def follow(self, rgb_frame):
+        """Moves the tracks on a frame where detection was skipped."""
+        self._frames_since_detection += 1
+        if self.backend != "opencv":
+            return
+        for track in self.tracks:
+            if track.cv_tracker is None:
+                continue
+            ok, (x, y, w, h) = track.cv_tracker.update(rgb_frame)
+            if ok:
+                track.box = (int(y), int(x + w), int(y + h), int(x))
+
+    def rescale(self, factor):
+        """Scales all track boxes after the detection scale has changed."""
+        for track in self.tracks:
+            track.box = scale_boxes([track.box], factor)[0]
+            # OpenCV trackers hold the old image size; re-created on detection
+            track.cv_tracker = None
+        self._frames_since_detection = self.detect_every
+
+    def _init_cv_tracker(self, track, rgb_frame):
+        track.cv_tracker = _create_opencv_tracker()
+        if track.cv_tracker is None:
+            return
+        top, right, bottom, left = track.box
+        track.cv_tracker.init(rgb_frame, (left, top, right - left, bottom - top))
+
+    def stats(self):
+        """Returns the tracking counters as a dict."""
+        return {
+            "detections": self.detections,
+            "tracks_created": self.tracks_created,
+            "encodes": self.encodes,
+            "resets": self.resets,
+        }
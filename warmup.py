@@ -0,0 +1,122 @@
+"""Loading of the heavy libraries in the background, after the window is up."""
+
+import functools
+import importlib
+import threading
+import time
+
+# Slowest to import first; face_recognition also loads the dlib models
+HEAVY_MODULES = ("face_recognition", "cv2", "numpy", "openpyxl")
+
+
+def import_steps(modules=HEAVY_MODULES):
+    """Returns WarmUp steps that import each of the given modules."""
+    return [
+        (name, functools.partial(importlib.import_module, name)) for name in modules
+    ]
+
+
+def warm_up_models(height=240, width=320):
+    """
+    Runs one face detection and one encoding on a synthetic image, so the
+    first student in front of the camera does not pay for loading the dlib
+    models and for their first, slowest inference.
+    """
+    import face_recognition
+    import numpy as np
+
+    image = np.random.default_rng(0).integers(0, 256, (height, width, 3), np.uint8)
+    face_recognition.face_locations(image)
+    # The landmark and encoding models run on any box, no real face is needed
+    box = (height // 4, 3 * width // 4, 3 * height // 4, width // 4)
+    face_recognition.face_encodings(image, [box])
+
+
+class WarmUp:
+    """
+    Runs (label, callable) steps one after another on a background thread and
+    records how long each took. Code that depends on a step calls wait() before
+    using it; an import that is still running on the warm-up thread would block
+    the caller anyway, so nothing is ever loaded twice.
+    """
+
+    def __init__(self, steps=()):
+        self.steps = list(steps)
+        self.timings = {}
+        self._thread = threading.Thread(target=self._run, name="WarmUp", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def wait(self):
+        """Blocks until every step has run. Returns at once if never started."""
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        for label, step in self.steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                print(f"Warning: Warm-up step '{label}' failed: {e}")
+                continue
+            self.timings[label] = time.perf_counter() - start
+        print(f"Warm-up finished: {self.report()}")
+
+    def report(self):
+        """Returns the step timings as one line, e.g. "cv2 0.31s, numpy 0.12s"."""
+        return ", ".join(
+            f"{label} {seconds:.2f}s" for label, seconds in self.timings.items()
+        )
+
+
+def import_time_report(statement="import app"):
+    """
+    Runs `statement` in a fresh interpreter with `python -X importtime` and
+    returns (total_seconds, {top-level package: seconds}), where each package
+    is charged the time spent in its own modules.
+    """
+    import subprocess
+    import sys
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    packages = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # The header line
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1e6
+    return sum(packages.values()), packages
+
+
+if __name__ == "__main__":
+    # Import-time report of the app, to spot modules that slow down startup:
+    #   python warmup.py              time until the window can be shown
+    #   python warmup.py --heavy      plus everything the warm-up loads
+    import argparse
+
+    parser = argparse.ArgumentParser(description=import_time_report.__doc__)
+    parser.add_argument("--heavy", action="store_true")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    statement = "import app"
+    if args.heavy:
+        statement += "".join(f"; import {name}" for name in HEAVY_MODULES)
+    total, packages = import_time_report(statement)
+    print(f"{statement}: {total * 1000:.0f} ms")
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    for package, seconds in ranked[: args.top]:
+        print(f"{package:>24}: {seconds * 1000:8.1f} ms")